@@ -0,0 +1,148 @@
+#!/usr/bin/python3
+"""
+Generate synthetic FMF tree with unittest and pytest test files for benchmarks
+"""
+
+import argparse
+import os
+
+# decorators used for tests, more decorators than listed here add tags
+DECORATORS = (
+    '@FMF.tag("Tier{num}")',
+    '@FMF.tier("{num}")',
+    '@FMF.link("https://example.com/issue/{num}")',
+    '@FMF.component("component{num}")',
+    '@FMF.environment(VARIABLE{num}="value")',
+    '@FMF.description("Description of test {num}")',
+    '@FMF.summary("Summary of test {num}")',
+    '@FMF.adjust(when="distro < fedora-{num}", enabled=False)',
+)
+UNITTEST_DIR = "unittest"
+PYTEST_DIR = "pytest"
+LEVEL_DIR = "level{}"
+UNITTEST_GLOB = "test_unit_*.py"
+PYTEST_GLOB = "test_*.py"
+
+DEFAULTS = dict(files=20, classes=5, tests=10, parametrize=3, decorators=3, depth=3)
+
+
+def decorator_lines(count, num):
+    return [
+        (DECORATORS[index] if index < len(DECORATORS) else DECORATORS[0]).format(
+            num=num + index
+        )
+        for index in range(count)
+    ]
+
+
+def unittest_file(classes, tests, decorator_count):
+    lines = ["import unittest", "from fmf_metadata import FMF", ""]
+    for cls_num in range(classes):
+        lines += ["", f"class TestClass{cls_num}(unittest.TestCase):"]
+        for test_num in range(tests):
+            lines += [
+                f"    {item}" for item in decorator_lines(decorator_count, test_num)
+            ]
+            lines += [
+                f"    def test_{test_num}(self):",
+                f'        """ Test number {test_num} of class {cls_num} """',
+                "        pass",
+                "",
+            ]
+    return "\n".join(lines)
+
+
+def pytest_file(classes, tests, parametrize, decorator_count):
+    lines = ["import pytest", "from fmf_metadata import FMF", ""]
+    for cls_num in range(classes):
+        lines += ["", f"class TestClass{cls_num}:"]
+        for test_num in range(tests):
+            lines += [
+                f"    {item}" for item in decorator_lines(decorator_count, test_num)
+            ]
+            if parametrize > 1:
+                lines.append(
+                    f'    @pytest.mark.parametrize("value", range({parametrize}))'
+                )
+                lines.append(f"    def test_{test_num}(self, value):")
+            else:
+                lines.append(f"    def test_{test_num}(self):")
+            lines += ["        pass", ""]
+    return "\n".join(lines)
+
+
+def write(path, content):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as fd:
+        fd.write(content)
+
+
+def generate_tree(
+    root,
+    files=DEFAULTS["files"],
+    classes=DEFAULTS["classes"],
+    tests=DEFAULTS["tests"],
+    parametrize=DEFAULTS["parametrize"],
+    decorators=DEFAULTS["decorators"],
+    depth=DEFAULTS["depth"],
+):
+    """
+    Create FMF tree in root, returns directories with unittest and pytest files.
+    Test files are stored in the deepest of depth nested FMF directories
+    """
+    write(os.path.join(root, ".fmf", "version"), "1\n")
+    write(os.path.join(root, "main.fmf"), "test: echo root\n")
+    unittest_dir = os.path.join(root, UNITTEST_DIR)
+    for num in range(files):
+        write(
+            os.path.join(unittest_dir, UNITTEST_GLOB.replace("*", str(num))),
+            unittest_file(classes, tests, decorators),
+        )
+    pytest_dir = os.path.join(root, PYTEST_DIR)
+    write(os.path.join(pytest_dir, "main.fmf"), "tier: '1'\n")
+    for level in range(depth):
+        pytest_dir = os.path.join(pytest_dir, LEVEL_DIR.format(level))
+        write(os.path.join(pytest_dir, "main.fmf"), f"tag+: [level{level}]\n")
+    for num in range(files):
+        write(
+            os.path.join(pytest_dir, PYTEST_GLOB.replace("*", str(num))),
+            pytest_file(classes, tests, parametrize, decorators),
+        )
+    return unittest_dir, pytest_dir
+
+
+def add_size_arguments(parser):
+    parser.add_argument("--files", type=int, default=DEFAULTS["files"])
+    parser.add_argument("--classes", type=int, default=DEFAULTS["classes"])
+    parser.add_argument("--tests", type=int, default=DEFAULTS["tests"])
+    parser.add_argument(
+        "--parametrize",
+        type=int,
+        default=DEFAULTS["parametrize"],
+        help="number of parameters of every pytest test",
+    )
+    parser.add_argument(
+        "--decorators",
+        type=int,
+        default=DEFAULTS["decorators"],
+        help="FMF decorators per test",
+    )
+    parser.add_argument(
+        "--depth",
+        type=int,
+        default=DEFAULTS["depth"],
+        help="number of nested FMF directories above pytest files",
+    )
+
+
+def size_arguments(opts):
+    return {key: getattr(opts, key) for key in DEFAULTS}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    add_size_arguments(parser)
+    parser.add_argument("root")
+    opts = parser.parse_args()
+    for directory in generate_tree(opts.root, **size_arguments(opts)):
+        print(directory)
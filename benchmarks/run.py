@@ -0,0 +1,234 @@
+#!/usr/bin/python3
+"""
+Benchmarks of FMF metadata generation on synthetic test tree.
+
+Every measurement runs in a separate process (imported test modules and
+decorated functions are not shared between runs), time and growth of peak
+memory (per test) are measured. Results are stored as JSON and optionally
+compared with baseline, exit code is 1 in case some phase is slower than
+baseline by more than tolerance.
+"""
+
+import argparse
+import glob
+import json
+import os
+import platform
+import resource
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from generate_tree import (
+    UNITTEST_GLOB,
+    add_size_arguments,
+    generate_tree,
+    size_arguments,
+)
+
+PHASES = ("unittest", "pytest", "store", "startup", "startup_unittest")
+# phases running CLI in new process (cold start), one "test" is processed
+STARTUP_PHASES = ("startup", "startup_unittest")
+
+
+def max_rss():
+    """ Peak memory of current process in bytes """
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss if sys.platform == "darwin" else rss * 1024
+
+
+def measure(phase, unittest_dir, pytest_dir):
+    """
+    Run phase in current process, returns time in seconds
+    and growth of peak memory in bytes
+    """
+    if phase in STARTUP_PHASES:
+        args = ["--help"]
+        if phase == "startup_unittest":
+            # generation for one unittest file, it must not import fmf and pytest
+            first = sorted(glob.glob(os.path.join(unittest_dir, UNITTEST_GLOB)))[0]
+            args = ["--path", unittest_dir, os.path.basename(first)]
+        memory = max_rss()
+        start = time.perf_counter()
+        subprocess.run(
+            [sys.executable, "-m", "fmf_metadata.cli"] + args,
+            check=True,
+            stdout=subprocess.DEVNULL,
+        )
+        return time.perf_counter() - start, max_rss() - memory
+
+    from fmf_metadata.base import dict_to_yaml, store_to_fmf_files, yaml_fmf_output
+    from fmf_metadata.constants import PYTEST_DEFAULT_CONF
+    from fmf_metadata.pytest_collector import pytest_fmf_output
+
+    if phase == "unittest":
+        memory = max_rss()
+        start = time.perf_counter()
+        dict_to_yaml(
+            yaml_fmf_output(
+                path=unittest_dir, testfile_globs=[UNITTEST_GLOB], fmf_file=""
+            )
+        )
+    elif phase == "pytest":
+        memory = max_rss()
+        start = time.perf_counter()
+        pytest_fmf_output([pytest_dir], config=PYTEST_DEFAULT_CONF)
+    elif phase == "store":
+        out = pytest_fmf_output([pytest_dir], config=PYTEST_DEFAULT_CONF)
+        memory = max_rss()
+        start = time.perf_counter()
+        store_to_fmf_files(out, update=True)
+    else:
+        raise ValueError(f"unknown phase {phase}")
+    return time.perf_counter() - start, max_rss() - memory
+
+
+def test_count(phase, params):
+    """ Number of tests processed by phase """
+    if phase in STARTUP_PHASES:
+        return 1
+    count = params["files"] * params["classes"] * params["tests"]
+    if phase == "unittest":
+        return count
+    return count * max(params["parametrize"], 1)
+
+
+def run_phase(phase, root, test_dirs, repeat, tests):
+    """ Measure phase repeat times, every run in new process and fresh tree copy """
+    times = list()
+    memory = list()
+    for _ in range(repeat):
+        tree = tempfile.mkdtemp(prefix="fmf_benchmark_")
+        try:
+            shutil.copytree(root, tree, dirs_exist_ok=True)
+            with tempfile.NamedTemporaryFile("r", suffix=".json") as result:
+                worker_args = [os.path.join(tree, item) for item in test_dirs]
+                subprocess.run(
+                    [sys.executable, __file__, "--phase", phase, result.name]
+                    + worker_args,
+                    check=True,
+                    stdout=subprocess.DEVNULL,
+                    stderr=subprocess.DEVNULL,
+                )
+                measured = json.load(result)
+                times.append(measured["seconds"])
+                memory.append(measured["memory"])
+        finally:
+            shutil.rmtree(tree)
+    return dict(
+        min=min(times),
+        median=statistics.median(times),
+        times=times,
+        tests=tests,
+        memory_per_test=min(memory) / tests,
+    )
+
+
+def compare(results, baseline, tolerance):
+    """ Print comparison with baseline, returns list of regressed phases """
+    regressions = list()
+    for phase, result in results["phases"].items():
+        if phase not in baseline.get("phases", {}):
+            print(f"{phase}: {result['min']:.3f}s (not in baseline)")
+            continue
+        expected = baseline["phases"][phase]["min"]
+        ratio = result["min"] / expected
+        print(f"{phase}: {result['min']:.3f}s, baseline {expected:.3f}s ({ratio:.2f}x)")
+        expected_memory = baseline["phases"][phase].get("memory_per_test")
+        if expected_memory is not None:
+            print(
+                f"{phase}: {result['memory_per_test']:.0f} bytes per test, "
+                f"baseline {expected_memory:.0f} bytes per test"
+            )
+        if ratio > 1 + tolerance:
+            regressions.append(phase)
+    if baseline.get("params") != results["params"]:
+        print(f"WARNING: baseline uses different tree: {baseline.get('params')}")
+    return regressions
+
+
+def arg_parser():
+    parser = argparse.ArgumentParser(description=__doc__)
+    add_size_arguments(parser)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument(
+        "--phases",
+        default=",".join(PHASES),
+        help=f"comma separated list of phases ({', '.join(PHASES)})",
+    )
+    parser.add_argument("--output", help="store results to JSON file")
+    parser.add_argument("--baseline", help="compare with results in JSON file")
+    parser.add_argument(
+        "--no-baseline",
+        action="store_true",
+        help="do not fail when baseline file does not exist",
+    )
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.2,
+        help="allowed slowdown against baseline (0.2 means 20%%)",
+    )
+    parser.add_argument("--phase", help=argparse.SUPPRESS)
+    parser.add_argument("worker_args", nargs="*", help=argparse.SUPPRESS)
+    return parser
+
+
+def main():
+    parser = arg_parser()
+    opts = parser.parse_args()
+    if opts.phase:
+        # worker process, measures one phase in given tree
+        result, unittest_dir, pytest_dir = opts.worker_args
+        seconds, memory = measure(opts.phase, unittest_dir, pytest_dir)
+        with open(result, "w") as fd:
+            json.dump(dict(seconds=seconds, memory=memory), fd)
+        return 0
+    baseline = opts.baseline
+    if baseline and not os.path.exists(baseline):
+        if not opts.no_baseline:
+            # checked before the run, missing baseline is not a passed comparison
+            parser.error(
+                f"baseline {baseline} does not exist, create it "
+                "(make benchmark_baseline) or use --no-baseline"
+            )
+        print(f"Baseline {baseline} does not exist, nothing to compare")
+        baseline = None
+    params = size_arguments(opts)
+    root = tempfile.mkdtemp(prefix="fmf_benchmark_tree_")
+    try:
+        test_dirs = [
+            os.path.relpath(item, root) for item in generate_tree(root, **params)
+        ]
+        results = dict(
+            params=params,
+            python=platform.python_version(),
+            phases={
+                phase: run_phase(
+                    phase, root, test_dirs, opts.repeat, test_count(phase, params)
+                )
+                for phase in opts.phases.split(",")
+            },
+        )
+    finally:
+        shutil.rmtree(root)
+    output = json.dumps(results, indent=4)
+    if opts.output:
+        with open(opts.output, "w") as fd:
+            fd.write(output + "\n")
+    else:
+        print(output)
+    if baseline:
+        with open(baseline) as fd:
+            regressions = compare(results, json.load(fd), opts.tolerance)
+        if regressions:
+            print(f"Slower than baseline: {', '.join(regressions)}")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,3 +1,3 @@
-from fmf_metadata.base import FMF
+from fmf_metadata.decorators import FMF
 
 _ = FMF
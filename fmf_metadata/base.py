@@ -1,19 +1,25 @@
 from typing import List
+import copy
 import io
-import inspect
 import unittest
 import yaml
-import importlib
+import importlib.machinery
+import importlib.util
 import os
 import glob
 import sys
 import ast
-import fmf
 import shlex
+import stat
+import tempfile
 import re
+from collections.abc import Mapping
+from contextlib import contextmanager
 from functools import lru_cache
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 
-from fmf_metadata.constants import (
+# names used by decorators are still importable from here
+from fmf_metadata.constants import (  # noqa: F401
     FMF_POSTFIX,
     FMF_ATTRIBUTES,
     FMF_ATTR_PREFIX,
@@ -30,17 +36,44 @@ from fmf_metadata.constants import (
     TESTFILE_GLOBS,
     CONFIG_MERGE_PLUS,
     CONFIG_MERGE_MINUS,
+    CONFIG_RECURSIVE,
+    CONFIG_EXCLUDE,
     ENVIRONMENT_KEY,
+    FMF_ROOT_DIR,
+    FMF_COMPACTED_NODE,
+    FMF_DATA_CACHE,
+    FMF_REGISTRY,
+    WRITE_JOBS,
 )
-
+from fmf_metadata.decorators import (  # noqa: F401
+    Error,
+    FMFError,
+    is_test_function,
+    fmf_registry,
+    fmf_class_metadata,
+    fmf_merged_registry,
+    fmf_attribute,
+    __store_attribute,
+    __set_method_attribute,
+    set_obj_attribute,
+    generic_metadata_setter,
+    fmf_prefixed_name,
+    FMF,
+)
+from fmf_metadata.discovery import PathPattern, is_ignored, scan_test_files
 
 _ = shlex
-# Handle both older and newer yaml loader
-# https://msg.pyyaml.org/load
+# Use LibYAML (C implementation) when available, it is much faster
 try:
-    from yaml import FullLoader as YamlLoader
+    from yaml import CSafeLoader as _SafeLoader, CSafeDumper as _CSafeDumper
 except ImportError:  # pragma: no cover
-    from yaml import SafeLoader as YamlLoader
+    from yaml import SafeLoader as _SafeLoader
+
+    _CSafeDumper = None
+
+
+class YamlLoader(_SafeLoader):
+    pass
 
 
 # Load all strings from YAML files as unicode
@@ -52,12 +85,33 @@ def construct_yaml_str(self, node):
 YamlLoader.add_constructor("tag:yaml.org,2002:str", construct_yaml_str)
 
 
+class _NoAliases:
+    # disable references inside yaml files
+    def ignore_aliases(self, data):
+        return True
+
+
+class YamlDumper(_NoAliases, yaml.SafeDumper):
+    pass
+
+
+if _CSafeDumper is not None:
+
+    class CYamlDumper(_NoAliases, _CSafeDumper):
+        pass
+
+else:  # pragma: no cover
+    CYamlDumper = None
+
+
 def debug_print(*args, **kwargs):
     kwargs["file"] = sys.stderr
     print(*args, **kwargs)
 
 
 class _Test:
+    __slots__ = ("test", "name", "method")
+
     def __init__(self, test):
         self.test = test
         if hasattr(test, "_testMethodName"):
@@ -69,6 +123,8 @@ class _Test:
 
 
 class _TestCls:
+    __slots__ = ("file", "cls", "name", "tests")
+
     def __init__(self, test_class, filename):
         self.file = filename
         self.cls = test_class
@@ -77,13 +133,17 @@ class _TestCls:
 
 
 def filepath_tests(filename) -> List[_TestCls]:
-    test_loader = unittest.TestLoader()
-    output: List[_TestCls] = []
     loader = importlib.machinery.SourceFileLoader("non_important", filename)
     module = importlib.util.module_from_spec(
         importlib.util.spec_from_loader(loader.name, loader)
     )
     loader.exec_module(module)
+    return module_tests(module, filename)
+
+
+def module_tests(module, filename) -> List[_TestCls]:
+    test_loader = unittest.TestLoader()
+    output: List[_TestCls] = []
     for test_suite in test_loader.loadTestsFromModule(module):
         for test in test_suite:
             cls = _TestCls(test.__class__, filename)
@@ -95,10 +155,30 @@ def filepath_tests(filename) -> List[_TestCls]:
     return output
 
 
-def get_test_files(path, testfile_globs):
-    output = list()
-    for testfile_glob in testfile_globs:
-        output += glob.glob(os.path.join(path, testfile_glob))
+def get_test_files(path, testfile_globs, recursive=False, exclude=None):
+    """
+    Test files in path matching testfile_globs, recursive searches
+    subdirectories as well. Paths matching exclude patterns (.gitignore style)
+    are skipped, every file is listed once
+    """
+    if recursive:
+        output = scan_test_files(path, testfile_globs, exclude=exclude)
+    else:
+        output = list()
+        for testfile_glob in testfile_globs:
+            output += sorted(glob.glob(os.path.join(path, testfile_glob)))
+        # the same file could match several globs
+        output = list(dict.fromkeys(output))
+        if exclude:
+            patterns = [PathPattern(item) for item in exclude]
+            # the same rules as in recursive search (negated patterns)
+            output = [
+                item
+                for item in output
+                if not is_ignored(
+                    patterns, os.path.relpath(item, path), os.path.isdir(item)
+                )
+            ]
     if not output:
         raise FMFError(
             "There are no test in path {} via {}".format(path, testfile_globs)
@@ -106,243 +186,6 @@ def get_test_files(path, testfile_globs):
     return output
 
 
-class Error(Exception):
-    def __init__(self, msg):
-        self.msg = msg
-
-    def __str__(self):
-        return self.msg
-
-
-class FMFError(Error):
-    pass
-
-
-def is_test_function(member):
-    return inspect.isfunction(member) and member.__name__.startswith(TEST_METHOD_PREFIX)
-
-
-def __set_method_attribute(item, attribute, value, post_mark, base_type=None):
-    if post_mark not in FMF_POSTFIX:
-        raise FMFError("as postfix you can use + or - or let it empty (FMF merging)")
-    attr_postfixed = attribute + post_mark
-    for postfix in set(FMF_POSTFIX) - {post_mark}:
-        if hasattr(item, attribute + postfix):
-            raise FMFError(
-                "you are mixing various post_marks for {} ({} already exists)".format(
-                    item, attribute + postfix
-                )
-            )
-    if base_type is None:
-        if isinstance(value, list) or isinstance(value, tuple):
-            base_type = (list,)
-        elif isinstance(value, dict):
-            base_type = dict
-            value = [value]
-        else:
-            value = [value]
-
-    if isinstance(base_type, tuple) and base_type[0] in [tuple, list]:
-        if not hasattr(item, attr_postfixed):
-            setattr(item, attr_postfixed, list())
-        # check expected object types for FMF attributes
-        for value_item in value:
-            if len(base_type) > 1 and not isinstance(value_item, tuple(base_type[1:])):
-                raise FMFError(
-                    "type {} (value:{}) is not allowed, please use: {} ".format(
-                        type(value_item), value_item, base_type[1:]
-                    )
-                )
-        getattr(item, attr_postfixed).extend(list(value))
-        return
-
-    # use just first value in case you don't use list of tuple
-    if len(value) > 1:
-        raise FMFError(
-            "It is not permitted for {} (type:{}) put multiple values ({})".format(
-                attribute, base_type, value
-            )
-        )
-    first_value = value[0]
-    if base_type and not isinstance(first_value, base_type):
-        raise FMFError(
-            "type {} (value:{}) is not allowed, please use: {} ".format(
-                type(first_value), first_value, base_type
-            )
-        )
-    if base_type in [dict]:
-        if not hasattr(item, attr_postfixed):
-            setattr(item, attr_postfixed, dict())
-        first_value.update(getattr(item, attr_postfixed))
-    if hasattr(item, attr_postfixed) and base_type not in [dict]:
-        # if it is already defined (not list types or dict) exit
-        # class decorators are applied right after, does not make sense to rewrite more specific
-        # dict updating is reversed
-        return
-    setattr(item, attr_postfixed, first_value)
-
-
-def set_obj_attribute(
-    testEntity,
-    attribute,
-    value,
-    raise_text=None,
-    base_class=unittest.TestCase,
-    base_type=None,
-    post_mark="",
-):
-    if inspect.isclass(testEntity) and issubclass(testEntity, base_class):
-        for test_function in inspect.getmembers(testEntity, is_test_function):
-            __set_method_attribute(
-                test_function[1],
-                attribute,
-                value,
-                post_mark=post_mark,
-                base_type=base_type,
-            )
-    elif is_test_function(testEntity):
-        __set_method_attribute(
-            testEntity, attribute, value, base_type=base_type, post_mark=post_mark
-        )
-    elif raise_text:
-        raise FMFError(raise_text)
-    return testEntity
-
-
-def generic_metadata_setter(
-    attribute,
-    value,
-    raise_text=None,
-    base_class=unittest.TestCase,
-    base_type=None,
-    post_mark="",
-):
-    def inner(testEntity):
-        return set_obj_attribute(
-            testEntity,
-            attribute,
-            value,
-            raise_text,
-            base_class,
-            base_type=base_type,
-            post_mark=post_mark,
-        )
-
-    return inner
-
-
-def fmf_prefixed_name(name):
-    return FMF_ATTR_PREFIX + name
-
-
-class __FMFMeta(type):
-    @staticmethod
-    def _set_fn(name, base_type=None):
-        if name not in FMF_ATTRIBUTES:
-            raise FMFError(
-                "fmf decorator {} not found in {}".format(name, FMF_ATTRIBUTES.keys())
-            )
-
-        def inner(*args, post_mark=""):
-            return generic_metadata_setter(
-                fmf_prefixed_name(name),
-                args,
-                base_type=base_type or FMF_ATTRIBUTES[name],
-                post_mark=post_mark,
-            )
-
-        return inner
-
-    def __getattr__(cls, name):
-        return cls._set_fn(name)
-
-
-class FMF(metaclass=__FMFMeta):
-    """
-    This class implements class decorators for TMT semantics via dynamic class methods
-    see https://tmt.readthedocs.io/en/latest/spec/tests.html
-    """
-
-    @classmethod
-    def tag(cls, *args, post_mark=""):
-        """
-        generic purpose test tags to be used (e.g. "slow", "fast", "security")
-        https://tmt.readthedocs.io/en/latest/spec/tests.html#tag
-        """
-        return cls._set_fn("tag", base_type=FMF_ATTRIBUTES["tag"])(
-            *args, post_mark=post_mark
-        )
-
-    @classmethod
-    def link(cls, *args, post_mark=""):
-        """
-        generic url links (default is verify) but could contain more see TMT doc
-        https://tmt.readthedocs.io/en/latest/spec/core.html#link
-        """
-        return cls._set_fn("link", base_type=FMF_ATTRIBUTES["link"])(
-            *args, post_mark=post_mark
-        )
-
-    @classmethod
-    def bug(cls, *args, post_mark=""):
-        """
-        link to relevant bugs what this test verifies.
-        It can be link to issue tracker or bugzilla
-        https://tmt.readthedocs.io/en/latest/spec/tests.html#link
-        """
-        return cls.link(*[{"verifies": arg} for arg in args], post_mark=post_mark)
-
-    @classmethod
-    def adjust(
-        cls, when, because=None, continue_execution=True, post_mark="", **kwargs
-    ):
-        """
-        adjust testcase execution, see TMT specification
-        https://tmt.readthedocs.io/en/latest/spec/core.html#adjust
-
-        if key value arguments are passed they are applied as update of the dictionary items
-        else disable test execution as default option
-
-        e.g.
-
-        @adjust("distro ~< centos-6", "The test is not intended for less than centos-6")
-        @adjust("component == bash", "modify component", component="shell")
-
-        tricky example with passing merging variables as kwargs to code
-        because python does not allow to do parameter as X+="something"
-        use **dict syntax for parameter(s)
-
-        @adjust("component == bash", "append env variable", **{"environment+": {"BASH":true}})
-        """
-        adjust_item = dict()
-        adjust_item["when"] = when
-        if because is not None:
-            adjust_item["because"] = because
-        if kwargs:
-            adjust_item.update(kwargs)
-        else:
-            adjust_item["enabled"] = False
-        if continue_execution is False:
-            adjust_item["continue"] = False
-        return cls._set_fn("adjust", base_type=FMF_ATTRIBUTES["adjust"])(
-            adjust_item, post_mark=post_mark
-        )
-
-    @classmethod
-    def environment(cls, post_mark="", **kwargs):
-        """
-        environment testcase execution, see TMT specification
-        https://tmt.readthedocs.io/en/latest/spec/test.html#environment
-
-        add environment keys
-        example:
-        @environment(PYTHONPATH=".", DATA_DIR="test_data")
-        """
-        return cls._set_fn(ENVIRONMENT_KEY, base_type=FMF_ATTRIBUTES[ENVIRONMENT_KEY])(
-            kwargs, post_mark=post_mark
-        )
-
-
 def identifier(text):
     return "/" + text
 
@@ -355,42 +198,34 @@ def default_key(parent_dict, key, empty_obj):
     return parent_dict[key]
 
 
-def __update_dict_key(method, key, fmf_key, dictionary, override_postfix=""):
+def __update_dict_key(found, fmf_key, dictionary, override_postfix=""):
     """
     This function have to ensure that there is righ one of attribute type extension
     and removes all others
     """
-    value = None
-    current_postfix = ""
-    # find if item is defined inside method
-    for attribute in dir(method):
-        stripped = attribute.rstrip("".join(FMF_POSTFIX))
-        if key == stripped:
-            value = getattr(method, attribute)
-            strip_len = len(stripped)
-            current_postfix = attribute[strip_len:]
+    current_postfix, value = found if found is not None else ("", None)
     # delete all keys in dictionary started with fmf_key
-    for item in dictionary.copy():
-        stripped = item.rstrip("".join(FMF_POSTFIX))
-        if stripped == fmf_key:
-            dictionary.pop(item)
+    for postfix in FMF_POSTFIX:
+        dictionary.pop(fmf_key + postfix, None)
     out_key = (
         fmf_key + override_postfix if override_postfix else fmf_key + current_postfix
     )
     if value is not None:
-        dictionary[out_key] = value
+        # the same keys are stored for every test
+        dictionary[sys.intern(out_key)] = value
+
 
+_ATTRIBUTE_KEYS = tuple(FMF_ATTRIBUTES)
 
-def __get_fmf_attr_name(method, attribute):
-    for current_attr in [fmf_prefixed_name(attribute + x) for x in FMF_POSTFIX]:
-        if hasattr(method, current_attr):
-            return current_attr
-    return fmf_prefixed_name(attribute)
+
+@lru_cache(maxsize=None)
+def _postfixed_keys(fmf_keys):
+    """ Keys with all merging postfixes, test_data_dict replaces them """
+    return tuple(key + postfix for key in fmf_keys for postfix in FMF_POSTFIX)
 
 
 def __find_fmf_root(path):
     root = os.path.abspath(path)
-    FMF_ROOT_DIR = ".fmf"
     while True:
         if os.path.exists(os.path.join(root, FMF_ROOT_DIR)):
             return root
@@ -401,15 +236,21 @@ def __find_fmf_root(path):
         root = os.path.dirname(root)
 
 
-def test_data_dict(
-    test_dict, config, filename, cls, test, merge_plus_list=None, merge_minus_list=None
-):
-    merge_plus_list = merge_plus_list or config.get(CONFIG_MERGE_PLUS, [])
-    merge_minus_list = merge_minus_list or config.get(CONFIG_MERGE_MINUS, [])
-    doc_str = (test.method.__doc__ or "").strip("\n")
+find_fmf_root = __find_fmf_root
+
+
+def __function_data(method, class_metadata, config, filename, cls, test, merge_args):
+    """
+    FMF attributes of test function (and its class decorators) as (key, value)
+    pairs, they are the same for all tests of the function (e.g. parametrized)
+    """
+    merge_plus_list, merge_minus_list = merge_args
+    registry = fmf_merged_registry(method, class_metadata)
+    doc_str = (method.__doc__ or "").strip("\n")
+    defaults = dict()
     # set summary attribute if not given by decorator
-    current_name = __get_fmf_attr_name(test.method, SUMMARY_KEY)
-    if not hasattr(test.method, current_name):
+    current_name = fmf_prefixed_name(SUMMARY_KEY)
+    if fmf_attribute(method, current_name, registry=registry) is None:
         # try to use first line of docstring if given
         if doc_str:
             summary = doc_str.split("\n")[0].strip()
@@ -419,15 +260,17 @@ def test_data_dict(
                 + (f"{cls.name} " if cls.name else "")
                 + test.name
             )
-        setattr(test.method, current_name, summary)
+        defaults[current_name] = ("", summary)
 
     # set description attribute by docstring if not given by decorator
-    current_name = __get_fmf_attr_name(test.method, DESCRIPTION_KEY)
-    if not hasattr(test.method, current_name):
+    current_name = fmf_prefixed_name(DESCRIPTION_KEY)
+    if fmf_attribute(method, current_name, registry=registry) is None:
         # try to use first line of docstring if given
         if doc_str:
-            description = doc_str
-            setattr(test.method, current_name, description)
+            defaults[current_name] = ("", doc_str)
+    if defaults:
+        registry = dict(registry, **defaults)
+    data = dict()
     # generic FMF attributes set by decorators
     for key in FMF_ATTRIBUTES:
         # Allow to override key storing with merging postfixes
@@ -437,17 +280,57 @@ def test_data_dict(
         elif key in merge_minus_list:
             override_postfix = "-"
         __update_dict_key(
-            test.method,
-            fmf_prefixed_name(key),
+            registry.get(fmf_prefixed_name(key)),
             key,
-            test_dict,
+            data,
             override_postfix,
         )
 
     # special config items
     if CONFIG_ADDITIONAL_KEY in config:
         for key, fmf_key in config[CONFIG_ADDITIONAL_KEY].items():
-            __update_dict_key(test.method, key, fmf_key, test_dict)
+            __update_dict_key(
+                fmf_attribute(method, key, registry=registry), fmf_key, data
+            )
+    return tuple(data.items())
+
+
+def test_data_dict(
+    test_dict, config, filename, cls, test, merge_plus_list=None, merge_minus_list=None
+):
+    merge_plus_list = merge_plus_list or config.get(CONFIG_MERGE_PLUS, [])
+    merge_minus_list = merge_minus_list or config.get(CONFIG_MERGE_MINUS, [])
+    additional_keys = config.get(CONFIG_ADDITIONAL_KEY, {})
+    # class decorators are merged here, they are not set to every test function
+    class_metadata = fmf_class_metadata(getattr(cls, "cls", None), test.method)
+    # computed once per function and class (name, pytest items use placeholder
+    # classes), FMF decorators drop it (or change version of class metadata)
+    cache_key = (
+        tuple(merge_plus_list),
+        tuple(merge_minus_list),
+        additional_keys,
+        cls.name,
+        tuple((metadata, metadata.version) for metadata in class_metadata),
+    )
+    cached = test.method.__dict__.get(FMF_DATA_CACHE)
+    if cached is not None and cached[0] == cache_key:
+        function_data = cached[1]
+    else:
+        function_data = __function_data(
+            test.method,
+            class_metadata,
+            config,
+            filename,
+            cls,
+            test,
+            (merge_plus_list, merge_minus_list),
+        )
+        setattr(test.method, FMF_DATA_CACHE, (cache_key, function_data))
+    # keys of all FMF attributes (with any postfix) are replaced
+    for key in _postfixed_keys(_ATTRIBUTE_KEYS + tuple(additional_keys.values())):
+        test_dict.pop(key, None)
+    for key, value in function_data:
+        test_dict[key] = value
     if CONFIG_POSTPROCESSING_TEST in config:
         __post_processing(
             test_dict, config[CONFIG_POSTPROCESSING_TEST], cls, test, filename
@@ -455,68 +338,426 @@ def test_data_dict(
     return test_dict
 
 
-def yaml_fmf_output(
+def file_fmf_dict(
+    filename,
+    filename_dict,
+    config,
+    merge_plus_list=None,
+    merge_minus_list=None,
+    static=False,
+):
+    """ Update FMF data of one test file (node /filename) """
+    if static:
+        # import here to avoid circular dependency (static collector uses base)
+        from fmf_metadata.static_collector import filepath_tests_static
+
+        discover = filepath_tests_static
+    else:
+        discover = filepath_tests
+    for cls in discover(filename):
+        class_dict = default_key(filename_dict, identifier(cls.name), {})
+        for test in cls.tests:
+            test_dict = default_key(class_dict, identifier(test.name), {})
+            test_data_dict(
+                test_dict=test_dict,
+                config=config,
+                filename=filename,
+                cls=cls,
+                test=test,
+                merge_plus_list=merge_plus_list,
+                merge_minus_list=merge_minus_list,
+            )
+    return filename_dict
+
+
+def _merged_dict(current, value):
+    """ Update current dictionary by value, nested dictionaries are merged """
+    for key, item in value.items():
+        if isinstance(item, dict) and isinstance(current.get(key), dict):
+            _merged_dict(current[key], item)
+        else:
+            current[key] = item
+
+
+def merge_generated(filename_dict, generated, config):
+    """
+    Update FMF data of one test file by data generated by file_fmf_dict
+    from empty node (e.g. cached ones), the same way as file_fmf_dict
+    updates existing data
+    """
+    additional_keys = config.get(CONFIG_ADDITIONAL_KEY, {})
+    replaced = _postfixed_keys(_ATTRIBUTE_KEYS + tuple(additional_keys.values()))
+    for class_name, class_data in generated.items():
+        class_dict = default_key(filename_dict, class_name, {})
+        for test_name, test_data in class_data.items():
+            test_dict = default_key(class_dict, test_name, {})
+            for key in replaced:
+                test_dict.pop(key, None)
+            # test_postprocessing merges nested dictionaries as well
+            _merged_dict(test_dict, test_data)
+    return filename_dict
+
+
+def _file_fmf_dict_job(args):
+    """ Process pool worker, returns FMF data or error message of one file """
+    try:
+        return file_fmf_dict(*args), None
+    except FMFError as exc:
+        return None, str(exc)
+
+
+def read_fmf_file(fmf_file):
+    """ Data of FMF file, empty dictionary if it does not exist """
+    if fmf_file and os.path.exists(fmf_file):
+        with open(fmf_file) as fd:
+            return yaml.load(fd, Loader=YamlLoader) or dict()
+    return dict()
+
+
+def _processed_files(pending, fmf_dict, config, merge_args, jobs):
+    """
+    Process pending test files, yields (FMF data, error message)
+    for every pending item in the same order
+    """
+    # cached files are generated without existing FMF data (see merge_generated)
+    inputs = [
+        {} if cache_key is not None else fmf_dict[filename_id]
+        for _, filename_id, cache_key in pending
+    ]
+    if jobs == 1:
+        for (filename, _, _), filename_dict in zip(pending, inputs):
+            yield file_fmf_dict(filename, filename_dict, config, *merge_args), None
+        return
+    job_args = [
+        (filename, filename_dict, config, *merge_args)
+        for (filename, _, _), filename_dict in zip(pending, inputs)
+    ]
+    with ProcessPoolExecutor(max_workers=jobs or None) as executor:
+        # map keeps order of files, so output is the same as serial one
+        yield from executor.map(_file_fmf_dict_job, job_args)
+
+
+def fmf_output_items(
     path=None,
     testfile_globs=None,
     fmf_file=None,
     config=None,
     merge_plus_list=None,
     merge_minus_list=None,
+    static=False,
+    jobs=1,
+    cache=None,
+    recursive=None,
+    exclude=None,
+    compact=False,
 ):
-    config = config or dict()
+    """
+    Generate FMF data for tests as (name, data) pairs of top level nodes,
+    in the same order as yaml_fmf_output. Node is yielded as soon as all its
+    test files are processed, jobs other than 1 process test files
+    in process pool (0 or None means number of CPUs).
+    With cache (fmf_metadata.cache.MetadataCache) only changed files are processed.
+    recursive searches test files in subdirectories as well, node name
+    is then relative path of the test file. compact moves attributes shared
+    by all tests of class (classes of file) to the class (file) node
+    (see fmf_metadata.compaction), the size reduction is reported
+    """
+    config = check_config(config)
     # set values in priority 1. input param, 2. from config file, 3. default value
     fmf_file = fmf_file or config.get(CONFIG_FMF_FILE, MAIN_FMF)
     testfile_globs = testfile_globs or config.get(CONFIG_TESTGLOBS, TESTFILE_GLOBS)
     path = os.path.realpath(path or config.get(CONFIG_TEST_PATH, TEST_PATH))
+    if recursive is None:
+        recursive = config.get(CONFIG_RECURSIVE, False)
+    exclude = exclude or config.get(CONFIG_EXCLUDE, [])
 
     debug_print("Use config:", config)
     debug_print("Input FMF file:", fmf_file)
     debug_print("Tests path:", path)
     debug_print("Test globs:", testfile_globs)
-    fmf_dict = dict()
-    if fmf_file and os.path.exists(fmf_file):
-        with open(fmf_file) as fd:
-            fmf_dict = yaml.load(fd, Loader=YamlLoader) or fmf_dict
-    for filename in get_test_files(path, testfile_globs):
-        filename_dict = default_key(
-            fmf_dict, identifier(os.path.basename(filename)), {}
+    fmf_dict = read_fmf_file(fmf_file)
+    # import here to avoid circular dependency (compaction uses base)
+    from fmf_metadata.compaction import Compaction, expand_compacted
+
+    compaction = Compaction(config) if compact else None
+    filenames = get_test_files(
+        path, testfile_globs, recursive=recursive, exclude=exclude
+    )
+    pending = list()
+    # nodes of test files, other nodes of FMF file are not compacted
+    test_nodes = set()
+    for filename in filenames:
+        if recursive:
+            filename_id = identifier(os.path.relpath(filename, path))
+        else:
+            filename_id = identifier(os.path.basename(filename))
+        filename_dict = default_key(fmf_dict, filename_id, {})
+        # attributes moved up by previous compaction are moved back
+        # to tests, where they are generated again (also without compact)
+        expand_compacted(filename_dict)
+        if compaction is not None:
+            test_nodes.add(filename_id)
+        cache_key = None
+        if cache is not None:
+            # just inputs of generated data, they are merged with existing
+            # node later, filename is available to test_postprocessing
+            cache_key = cache.key(
+                filename, config, filename, merge_plus_list, merge_minus_list, static
+            )
+            cached = cache.get(cache_key)
+            if cached is not None:
+                merge_generated(filename_dict, cached, config)
+                continue
+        pending.append((filename, filename_id, cache_key))
+
+    # node is complete after the last pending test file with the same name
+    last_file = {
+        filename_id: index for index, (_, filename_id, _) in enumerate(pending)
+    }
+    names = list(fmf_dict)
+    position = 0
+    errors = list()
+    results = _processed_files(
+        pending, fmf_dict, config, (merge_plus_list, merge_minus_list, static), jobs
+    )
+    for index in range(-1, len(pending)):
+        if index >= 0:
+            filename, filename_id, cache_key = pending[index]
+            filename_dict, error = next(results)
+            if error is not None:
+                errors.append(f"{filename}: {error}")
+                continue
+            if cache_key is not None:
+                cache.set(cache_key, filename_dict)
+                merge_generated(fmf_dict[filename_id], filename_dict, config)
+            else:
+                fmf_dict[filename_id] = filename_dict
+        if errors:
+            continue
+        while position < len(names) and last_file.get(names[position], -1) <= index:
+            name = names[position]
+            position += 1
+            # yielded data are not needed anymore
+            if name in test_nodes:
+                yield name, compaction.node(name, fmf_dict.pop(name))
+            else:
+                yield name, fmf_dict.pop(name)
+    if errors:
+        raise FMFError("\n".join(errors))
+    if cache is not None:
+        cache.evict()
+    if compaction is not None:
+        compaction.report()
+
+
+def yaml_fmf_output(
+    path=None,
+    testfile_globs=None,
+    fmf_file=None,
+    config=None,
+    merge_plus_list=None,
+    merge_minus_list=None,
+    static=False,
+    jobs=1,
+    cache=None,
+    recursive=None,
+    exclude=None,
+    compact=False,
+):
+    """
+    Generate FMF data for tests, jobs other than 1 process test files
+    in process pool (0 or None means number of CPUs).
+    With cache (fmf_metadata.cache.MetadataCache) only changed files are processed,
+    compact moves shared attributes up (see fmf_output_items)
+    """
+    return dict(
+        fmf_output_items(
+            path=path,
+            testfile_globs=testfile_globs,
+            fmf_file=fmf_file,
+            config=config,
+            merge_plus_list=merge_plus_list,
+            merge_minus_list=merge_minus_list,
+            static=static,
+            jobs=jobs,
+            cache=cache,
+            recursive=recursive,
+            exclude=exclude,
+            compact=compact,
         )
-        for cls in filepath_tests(filename):
-            class_dict = default_key(filename_dict, identifier(cls.name), {})
-            for test in cls.tests:
-                test_dict = default_key(class_dict, identifier(test.name), {})
-                test_data_dict(
-                    test_dict=test_dict,
-                    config=config,
-                    filename=filename,
-                    cls=cls,
-                    test=test,
-                    merge_plus_list=merge_plus_list,
-                    merge_minus_list=merge_minus_list,
-                )
-    return fmf_dict
+    )
+
+
+def compile_multiline(expr, type_ignores=None):
+    """
+    Compile several lines of input, returns code object of all lines except last
+    (None if there is nothing to execute) and code object of last line expression
+    """
+    tree = ast.parse(expr)
+    eval_expr = ast.Expression(tree.body[-1].value)
+    exec_code = None
+    # assignment expression in last line needs own context as statements
+    if tree.body[:-1] or any(isinstance(x, ast.NamedExpr) for x in ast.walk(tree)):
+        exec_expr = ast.Module(tree.body[:-1], type_ignores=type_ignores or [])
+        exec_code = compile(exec_expr, "file", "exec")
+    return exec_code, compile(eval_expr, "file", "eval")
 
 
 def multiline_eval(expr, context, type_ignores=None):
     """Evaluate several lines of input, returning the result of the last line
     https://stackoverflow.com/questions/12698028/why-is-pythons-eval-rejecting-this-multiline-string-and-how-can-i-fix-it
     """
-    tree = ast.parse(expr)
-    eval_expr = ast.Expression(tree.body[-1].value)
-    exec_expr = ast.Module(tree.body[:-1], type_ignores=type_ignores or [])
-    exec(compile(exec_expr, "file", "exec"), context)
-    return eval(compile(eval_expr, "file", "eval"), context)
+    exec_code, eval_code = compile_multiline(expr, type_ignores=type_ignores)
+    if exec_code is not None:
+        exec(exec_code, context)
+    return eval(eval_code, context)
+
+
+def compile_post_processing(config_dict, prefix=""):
+    """
+    Compile test_postprocessing config to the same structure of code objects,
+    wrong code raises FMFError
+    """
+    output = dict()
+    if not isinstance(config_dict, Mapping):
+        return output
+    for k, v in config_dict.items():
+        if isinstance(v, Mapping):
+            output[k] = compile_post_processing(v, prefix=f"{prefix}{k}.")
+            continue
+        try:
+            output[k] = compile_multiline(v)
+        except IndexError:
+            # nothing to evaluate (empty value or just comments)
+            raise FMFError(
+                f"Unable to compile {CONFIG_POSTPROCESSING_TEST} item "
+                f"{prefix}{k} ({v!r}): empty expression"
+            )
+        except (SyntaxError, AttributeError, TypeError, ValueError) as exc:
+            raise FMFError(
+                f"Unable to compile {CONFIG_POSTPROCESSING_TEST} item "
+                f"{prefix}{k} ({v!r}): {exc}"
+            )
+    return output
+
+
+@lru_cache(maxsize=32)
+def _compiled_post_processing(config_dict):
+    return compile_post_processing(config_dict)
+
+
+def compiled_post_processing(config_dict):
+    """ Compiled test_postprocessing config, cached by its (frozen) value """
+    if isinstance(config_dict, Mapping) and not isinstance(config_dict, FMFConfig):
+        config_dict = FMFConfig(config_dict)
+    return _compiled_post_processing(config_dict)
+
+
+def _freeze(value):
+    if isinstance(value, Mapping):
+        return FMFConfig(value)
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(item) for item in value)
+    if isinstance(value, set):
+        return frozenset(value)
+    return value
+
+
+class FMFConfig(Mapping):
+    """
+    Immutable and hashable configuration, nested dictionaries
+    and lists are converted to FMFConfig and tuples
+    """
+
+    __slots__ = ("_data", "_hash")
+
+    def __init__(self, data=None):
+        object.__setattr__(
+            self, "_data", {key: _freeze(value) for key, value in (data or {}).items()}
+        )
+        object.__setattr__(self, "_hash", None)
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{self.__class__.__name__} is immutable")
+
+    def __getitem__(self, key):
+        return self._data[key]
+
+    def __iter__(self):
+        return iter(self._data)
+
+    def __len__(self):
+        return len(self._data)
+
+    def __hash__(self):
+        if self._hash is None:
+            object.__setattr__(self, "_hash", hash(tuple(self._data.items())))
+        return self._hash
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}({self._data!r})"
+
+    def __reduce__(self):
+        return self.__class__, (self._data,)
+
+
+def check_config(config):
+    """
+    Freeze config to FMFConfig and compile code in it,
+    so errors are reported just once
+    """
+    if not isinstance(config, FMFConfig):
+        config = FMFConfig(config)
+    if CONFIG_POSTPROCESSING_TEST in config:
+        compiled_post_processing(config[CONFIG_POSTPROCESSING_TEST])
+    return config
+
+
+def resolve_config(config=None, default=None):
+    """
+    Effective configuration (FMFConfig): file from CONFIG environment variable,
+    config file path, or dictionary (default in case it is empty)
+    """
+    cfg_file = os.getenv("CONFIG")
+    if cfg_file:
+        return read_config(cfg_file)
+    if isinstance(config, (str, os.PathLike)):
+        return read_config(config)
+    return check_config(config or default)
 
 
 def __post_processing(input_dict, config_dict, cls, test, filename):
-    if isinstance(config_dict, dict):
-        for k, v in config_dict.items():
-            if isinstance(v, dict):
-                if k not in input_dict:
-                    input_dict[k] = dict()
-                __post_processing(input_dict[k], v, cls, test, filename)
-            else:
-                input_dict[k] = multiline_eval(v, dict(locals(), **globals()))
+    # modules used by config expressions, they are not globals of this module
+    # anymore (fmf is imported lazily, inspect is used by decorators)
+    import fmf
+    import inspect
+
+    # the same variables as were available as locals in previous implementation
+    context = dict(
+        globals(), fmf=fmf, inspect=inspect, cls=cls, test=test, filename=filename
+    )
+    __apply_post_processing(
+        input_dict, config_dict, compiled_post_processing(config_dict), context
+    )
+
+
+def __apply_post_processing(input_dict, config_dict, compiled, context):
+    for k, code in compiled.items():
+        if isinstance(code, dict):
+            if k not in input_dict:
+                input_dict[k] = dict()
+            __apply_post_processing(input_dict[k], config_dict[k], code, context)
+            continue
+        context.update(input_dict=input_dict, config_dict=config_dict)
+        context.update(k=k, v=config_dict[k])
+        exec_code, eval_code = code
+        if exec_code is None:
+            # expression can not change context, no need to copy it
+            input_dict[k] = eval(eval_code, context)
+        else:
+            local_context = dict(context)
+            exec(exec_code, local_context)
+            input_dict[k] = eval(eval_code, local_context)
 
 
 def read_config(config_file):
@@ -524,16 +765,52 @@ def read_config(config_file):
         raise FMFError(f"configuration files does not exists {config_file}")
     debug_print(f"Read config file: {config_file}")
     with open(config_file) as fd:
-        return yaml.safe_load(fd)
+        return check_config(yaml.load(fd, Loader=YamlLoader))
 
 
-def dict_to_yaml(data, width=None, sort=False):
-    """ Convert dictionary into yaml """
+def libyaml_compatible(data):
+    """
+    LibYAML emitter formats some strings differently than python one
+    (non ASCII characters, folding of long double quoted strings),
+    check that data does not contain such strings
+    """
+
+    def compatible_str(text):
+        if not text.isascii():
+            return False
+        if "\n" not in text:
+            return text.isprintable()
+        return (
+            text.replace("\n", "").isprintable()
+            and "\n " not in text
+            and " \n" not in text
+            and text.strip(" ") == text
+        )
+
+    stack = [data]
+    while stack:
+        item = stack.pop()
+        if isinstance(item, str):
+            if not compatible_str(item):
+                return False
+        elif isinstance(item, dict):
+            for key in item:
+                if isinstance(key, str) and (not key or "\n" in key):
+                    return False
+                stack.append(key)
+            stack.extend(item.values())
+        elif isinstance(item, (list, tuple)):
+            stack.extend(item)
+    return True
+
+
+def __dump_yaml(data, dumper, width=None, sort=False):
     output = io.StringIO()
     try:
-        yaml.safe_dump(
+        yaml.dump(
             data,
             output,
+            Dumper=dumper,
             sort_keys=sort,
             encoding="utf-8",
             allow_unicode=True,
@@ -546,12 +823,16 @@ def dict_to_yaml(data, width=None, sort=False):
         # https://stackoverflow.com/questions/31605131/
         # https://github.com/psss/tmt/issues/207
         def representer(self, data):
-            self.represent_mapping("tag:yaml.org,2002:map", data.items())
+            return self.represent_mapping("tag:yaml.org,2002:map", data.items())
 
-        yaml.add_representer(dict, representer, Dumper=yaml.SafeDumper)
-        yaml.safe_dump(
+        class InsertionOrderDumper(dumper):
+            pass
+
+        InsertionOrderDumper.add_representer(dict, representer)
+        yaml.dump(
             data,
             output,
+            Dumper=InsertionOrderDumper,
             encoding="utf-8",
             allow_unicode=True,
             width=width,
@@ -561,7 +842,36 @@ def dict_to_yaml(data, width=None, sort=False):
     return output.getvalue()
 
 
+def dict_to_yaml(data, width=None, sort=False):
+    """ Convert dictionary into yaml """
+    if CYamlDumper is None:
+        return __dump_yaml(data, YamlDumper, width=width, sort=sort)
+    if sort or not isinstance(data, dict) or not data:
+        dumper = CYamlDumper if libyaml_compatible(data) else YamlDumper
+        return __dump_yaml(data, dumper, width=width, sort=sort)
+    return "".join(yaml_chunks(data.items(), width=width))
+
+
+def yaml_chunks(items, width=None):
+    """
+    Convert (key, value) pairs of top level dictionary into yaml, one chunk
+    per item, joined chunks are the same as dict_to_yaml of whole dictionary
+    """
+    empty = True
+    for key, value in items:
+        empty = False
+        item = {key: value}
+        if CYamlDumper is not None and libyaml_compatible(item):
+            yield __dump_yaml(item, CYamlDumper, width=width)
+        else:
+            yield __dump_yaml(item, YamlDumper, width=width)
+    if empty:
+        yield dict_to_yaml(dict(), width=width)
+
+
 def get_node(fmf_root, relative):
+    import fmf
+
     tree = fmf.Tree(fmf_root)
     return tree.find(relative)
 
@@ -569,6 +879,8 @@ def get_node(fmf_root, relative):
 class StoreUpdater:
     def __init__(self):
         self._internal_dict = dict()
+        # fmf_metadata.compaction.Compaction of updated nodes (see updated_fmf_files)
+        self.compaction = None
 
     def __getitem__(self, node):
         return self._internal_dict[node.name]
@@ -615,6 +927,25 @@ class StoreUpdater:
     def merge(self, node, input_dict):
         merge_dict(input_dict, self[node][1])
 
+    def add(self, node, input_dict):
+        """ Store data of node, merge them to already stored data of node """
+        if node in self:
+            self.merge(node, input_dict)
+        else:
+            self[node] = input_dict
+
+    def serialize(self):
+        """ Items as plain data (list of FMF root, node name and data) """
+        return [
+            (node.root, name, data)
+            for name, (node, data) in self._internal_dict.items()
+        ]
+
+    def update_serialized(self, items):
+        """ Merge items created by serialize, nodes are found in FMF trees again """
+        for root, name, data in items:
+            self.add(tree_nodes(get_cached_tree(root))[name], data)
+
 
 def merge_dict(source, destination):
     """https://stackoverflow.com/questions/20656135/python-deep-merge-dictionary-data"""
@@ -630,12 +961,9 @@ def merge_dict(source, destination):
 
 
 def update_fmf_file(func, config, write_dict):
+    config = resolve_config(config)
     for item in func.items if hasattr(func, "items") else [func]:
-        node, out_dict = _update_fmf_file(item, config=config)
-        if node in write_dict:
-            write_dict.merge(node, out_dict)
-        else:
-            write_dict[node] = out_dict
+        write_dict.add(*_update_fmf_file(item, config=config))
     return write_dict
 
 
@@ -645,7 +973,7 @@ def str_normalise(text):
 
 def define_undefined(input_dict, keys, config, relative_test_path, cls, test):
     for item in keys:
-        item_id = f"/{item}"
+        item_id = sys.intern(f"/{item}")
         default_key(input_dict, item_id, empty_obj={})
         input_dict = input_dict[item_id]
     test_data_dict(
@@ -657,19 +985,71 @@ def define_undefined(input_dict, keys, config, relative_test_path, cls, test):
     )
 
 
+@lru_cache(maxsize=None)
+def fmf_root_tree(fmf_root):
+    """ FMF tree of the root, every FMF tree is read just once """
+    # fmf is imported just when some FMF tree is read (not e.g. in unittest mode)
+    import fmf
+
+    return fmf.Tree(fmf_root)
+
+
 @lru_cache(maxsize=None)
 def get_cached_tree(path_loc):
-    return fmf.Tree(path_loc)
+    """ FMF tree what contains path, shared by all paths in the tree """
+    return fmf_root_tree(__find_fmf_root(path_loc))
+
+
+@lru_cache(maxsize=None)
+def tree_nodes(tree):
+    """ All nodes of FMF tree by name """
+    return {node.name: node for node in tree.climb(whole=True)}
+
+
+@lru_cache(maxsize=None)
+def cached_realpath(path):
+    """ os.path.realpath of paths shared by many tests (files, directories) """
+    return os.path.realpath(path)
+
+
+def clear_tree_cache():
+    """ Forget FMF trees, they are read again (e.g. FMF files were changed) """
+    cached_realpath.cache_clear()
+    tree_nodes.cache_clear()
+    get_cached_tree.cache_clear()
+    fmf_root_tree.cache_clear()
+
+
+def deepest_node(tree, keys):
+    """
+    The deepest existing node on path given by keys (names of nested nodes)
+    and number of keys leading to it, nodes are found via tree_nodes index
+    """
+    nodes = tree_nodes(tree)
+    current = tree
+    for num, item in enumerate(keys):
+        # names of nodes never contain /
+        node = None
+        if item and "/" not in item:
+            node = nodes.get(os.path.join(current.name, item))
+        if node is None:
+            return current, num
+        current = node
+    return current, len(keys)
+
+
+def tree_layout(tree):
+    """ Names and source files of nodes, data of nodes are not included """
+    return tuple(
+        (name, node.sources[-1] if node.sources else None)
+        for name, node in tree_nodes(tree).items()
+    )
 
 
 def _update_fmf_file(func, config=None):
-    cfg_file = os.getenv("CONFIG")
-    if cfg_file:
-        config = read_config(cfg_file)
-    elif config and not isinstance(config, dict):
-        config = read_config(config)
-    else:
-        config = config or {}
+    # callers resolve config once per run
+    if not isinstance(config, FMFConfig):
+        config = resolve_config(config)
     fmf_file_location = func.fspath
     keys = list()
     file_loc = fmf_file_location
@@ -695,16 +1075,9 @@ def _update_fmf_file(func, config=None):
     ).group(1)
     # TODO: removed str_normalise(...) will see what happen
     keys.append(test.name)
-    current = tree
-    split_num = len(keys)
-    for num, item in enumerate(keys):
-        try:
-            current = current[f"/{item}"]
-        except KeyError:
-            split_num = num
-            break
+    current, split_num = deepest_node(tree, keys)
     relative_test_path = os.path.join(
-        file_loc.removeprefix(os.path.realpath(os.path.dirname(current.sources[-1]))),
+        file_loc.removeprefix(cached_realpath(os.path.dirname(current.sources[-1]))),
         os.path.basename(fmf_file_location),
     )
     undefined_keys = keys[split_num:]
@@ -713,21 +1086,208 @@ def _update_fmf_file(func, config=None):
     return current, store_dict
 
 
-def store_to_fmf_files(stored_items, update=False):
-    for node_name, value in stored_items.items():
-        if update:
-            changed = False
-            for k, v in value[1].items():
-                if k not in value[0].data or value[0].data[k] != v:
-                    changed = True
-                    break
-            if changed:
-                with value[0] as data:
-                    data.update(value[1])
-                debug_print(f"Updating node: {node_name} ({value[0].sources[-1]})")
-            else:
-                debug_print(f"Node not changed: {node_name} ({value[0].sources[-1]})")
-        else:
+@contextmanager
+def atomic_write(path, mode="w"):
+    """
+    Open temporary file in directory of path, it replaces path
+    when block finishes without exception, permissions of path are kept
+    """
+    try:
+        file_mode = stat.S_IMODE(os.stat(path).st_mode)
+    except FileNotFoundError:
+        file_mode = 0o644
+    fd, tmp_path = tempfile.mkstemp(
+        dir=os.path.dirname(path) or ".", prefix=f".{os.path.basename(path)}."
+    )
+    try:
+        with os.fdopen(fd, mode) as tmp_fd:
+            yield tmp_fd
+        os.chmod(tmp_path, file_mode)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def write_fmf_file(source, data):
+    """
+    Store data to FMF file atomically (via temporary file),
+    returns False if file content is the same and it was not written
+    """
+    import fmf.utils
+
+    content = fmf.utils.dict_to_yaml(data).encode("utf-8")
+    try:
+        with open(source, "rb") as fd:
+            if fd.read() == content:
+                return False
+    except FileNotFoundError:
+        pass
+    with atomic_write(source, "wb") as fd:
+        fd.write(content)
+    return True
+
+
+class _Missing:
+    def __repr__(self):
+        return "<missing>"
+
+
+MISSING = _Missing()
+
+
+def node_differences(expected, current, name="", removed=True):
+    """
+    Differences of FMF data node by node, list of (node name, key, current
+    value, expected value), child nodes (keys starting with /) are compared
+    recursively. removed=False ignores keys what are only in current data
+    """
+    output = list()
+    for key, value in expected.items():
+        current_value = current.get(key, MISSING)
+        if (
+            isinstance(key, str)
+            and key.startswith("/")
+            and isinstance(value, dict)
+            and isinstance(current_value, dict)
+        ):
+            output += node_differences(value, current_value, name + key, removed)
+        elif current_value != value:
+            output.append((name or "/", key, current_value, value))
+    if removed:
+        for key, current_value in current.items():
+            if key not in expected:
+                output.append((name or "/", key, current_value, MISSING))
+    return output
+
+
+def stale_fmf_nodes(stored_items):
+    """
+    Differences between collected data (StoreUpdater) and FMF files,
+    raw data of FMF files are compared with data what store_to_fmf_files
+    writes to them (see updated_fmf_files)
+    """
+    output = list()
+    for node_name, current, updated in updated_fmf_files(stored_items).values():
+        output += node_differences(updated, current, node_name.rstrip("/"))
+    return output
+
+
+def _compaction_root(node):
+    """ The top node above node (or node) what has record of compaction """
+    root = None
+    while node is not None:
+        if FMF_COMPACTED_NODE.lstrip("/") in node.children:
+            root = node
+        node = node.parent
+    return root
+
+
+def updated_fmf_files(stored_items):
+    """
+    Raw data of FMF files updated by data of nodes (StoreUpdater),
+    source -> (name of its node, current data, updated data), just changed
+    FMF files are returned, FMF trees are not changed.
+    Attributes moved by previous compaction are moved back to child nodes
+    before update, stored_items.compaction compacts updated nodes again
+    """
+    # import here to avoid circular dependency (compaction uses base)
+    from fmf_metadata.compaction import expand_compacted
+
+    compaction = stored_items.compaction
+    files = dict()
+
+    def raw_data(node):
+        # the same as node._locate_raw_data, in copy of data of FMF file
+        keys = list()
+        while not node._raw_data:
+            keys.insert(0, "/" + node.name.rsplit("/")[-1])
+            node = node.parent
+        source = node.sources[-1]
+        if source not in files:
+            files[source] = (node.name, node._raw_data, copy.deepcopy(node._raw_data))
+        data = files[source][2]
+        for key in keys:
+            if not isinstance(data.get(key), dict):
+                data[key] = dict()
+            data = data[key]
+        return data
+
+    roots = dict()
+    for node_name, (node, value) in stored_items.items():
+        root = _compaction_root(node)
+        if root is not None and root.name not in roots:
+            roots[root.name] = root
+            expand_compacted(raw_data(root))
+        if root is None and compaction is not None:
+            # new nodes, existing node is not changed
+            value = compaction.children(value, parent=node.data)
+        raw_data(node).update(value)
+    if compaction is not None:
+        for root in roots.values():
+            data = raw_data(root)
+            parent = root.parent.data if root.parent is not None else None
+            compacted = compaction.node(root.name, data, parent=parent)
+            data.clear()
+            data.update(compacted)
+        compaction.report()
+    return {source: item for source, item in files.items() if item[1] != item[2]}
+
+
+def _write_fmf_file_job(source, full_data):
+    """ Write one FMF file, returns (written, error message) """
+    try:
+        return write_fmf_file(source, full_data), None
+    except Exception as exc:
+        return False, f"{type(exc).__name__}: {exc}"
+
+
+def _written_fmf_files(fmf_files, jobs):
+    """
+    Write FMF files in jobs threads (0 or None means default number),
+    yields (source, written, error message) in order of fmf_files
+    """
+    items = list(fmf_files.items())
+    if jobs == 1 or len(items) < 2:
+        for source, full_data in items:
+            yield (source, *_write_fmf_file_job(source, full_data))
+        return
+    with ThreadPoolExecutor(
+        max_workers=min(jobs, len(items)) if jobs else None
+    ) as executor:
+        # files are serialized and written in threads (I/O bound),
+        # map keeps order of files, so output is the same as sequential one
+        results = executor.map(lambda item: _write_fmf_file_job(*item), items)
+        for (source, _), result in zip(items, results):
+            yield (source, *result)
+
+
+def store_to_fmf_files(stored_items, update=False, jobs=WRITE_JOBS):
+    """
+    Print or store (update) data of FMF nodes, every FMF file is written
+    just once, files are written in jobs threads. Failed files are reported
+    after all other files are written
+    """
+    # raw data of FMF files to write, every file is written just once
+    fmf_files = dict()
+    if update:
+        for node_name, (node, _) in stored_items.items():
+            debug_print(f"Updating node: {node_name} ({node.sources[-1]})")
+        for source, (_, _, full_data) in updated_fmf_files(stored_items).items():
+            fmf_files[source] = full_data
+    else:
+        for node_name, value in stored_items.items():
             debug_print(f"Node: {node_name}")
             for line in dict_to_yaml(value[1]).splitlines():
                 debug_print(f"\t{line}")
+    errors = list()
+    for source, written, error in _written_fmf_files(fmf_files, jobs):
+        if error is not None:
+            debug_print(f"Writing file failed: {source} ({error})")
+            errors.append(f"{source}: {error}")
+        elif written:
+            debug_print(f"Writing file: {source}")
+        else:
+            debug_print(f"File not changed: {source}")
+    if errors:
+        raise FMFError("\n".join(errors))
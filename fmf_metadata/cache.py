@@ -0,0 +1,184 @@
+import copy
+import hashlib
+import json
+import os
+import tempfile
+
+from fmf_metadata.base import FMFError, debug_print, find_fmf_root
+from fmf_metadata.constants import (
+    CACHE_DIR,
+    CACHE_MAX_SIZE,
+    CONFIG_ADDITIONAL_KEY,
+    CONFIG_MERGE_MINUS,
+    CONFIG_MERGE_PLUS,
+    CONFIG_POSTPROCESSING_TEST,
+)
+
+# items are stored as JSON, cache directory is inside repository and loading
+# of pickle from it could execute any code
+CACHE_SUFFIX = ".json"
+# items of previous versions, never used anymore
+LEGACY_SUFFIXES = (".pickle",)
+# config items what have influence to FMF data of one test file
+CACHE_CONFIG_KEYS = (
+    CONFIG_MERGE_PLUS,
+    CONFIG_MERGE_MINUS,
+    CONFIG_ADDITIONAL_KEY,
+    CONFIG_POSTPROCESSING_TEST,
+)
+
+
+def package_version():
+    """
+    Version of fmf_metadata, in case it is not installed (e.g. git checkout)
+    use hash of package sources instead
+    """
+    try:
+        from importlib.metadata import version
+
+        return version("fmf_metadata")
+    except Exception:
+        pass
+    package_dir = os.path.dirname(os.path.abspath(__file__))
+    digest = hashlib.sha256()
+    for filename in sorted(os.listdir(package_dir)):
+        if filename.endswith(".py"):
+            with open(os.path.join(package_dir, filename), "rb") as fd:
+                digest.update(fd.read())
+    return digest.hexdigest()
+
+
+class MetadataCache:
+    """
+    On disk cache of generated FMF data per test file.
+
+    Key consists of test file content, effective config and package version,
+    so only changed files are processed again. Changes in imported modules
+    (e.g. shared base classes) are not detected, use rebuild in such case.
+    Values are stored as JSON, values what JSON does not keep the same
+    (e.g. tuples) are not stored.
+    Least recently used entries are removed when cache exceeds max_size
+    """
+
+    def __init__(self, directory, max_size=CACHE_MAX_SIZE, rebuild=False):
+        self.directory = directory
+        self.max_size = max_size
+        self.rebuild = rebuild
+        self.version = package_version()
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(self.directory, exist_ok=True)
+
+    def key(self, filename, config, *args):
+        digest = hashlib.sha256()
+        digest.update(self.version.encode())
+        with open(filename, "rb") as fd:
+            digest.update(fd.read())
+        config = config or {}
+        # repr keeps order of items, what has influence to output
+        digest.update(repr([config.get(key) for key in CACHE_CONFIG_KEYS]).encode())
+        digest.update(repr(args).encode())
+        return digest.hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + CACHE_SUFFIX)
+
+    def get(self, key):
+        if self.rebuild:
+            self.misses += 1
+            return None
+        path = self._path(key)
+        try:
+            with open(path, encoding="utf-8") as fd:
+                value = json.load(fd)
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        except (OSError, ValueError) as exc:
+            debug_print(f"Ignoring broken cache item {path}: {exc}")
+            self.misses += 1
+            return None
+        # mtime is used as last access time for eviction
+        os.utime(path)
+        self.hits += 1
+        return value
+
+    def set(self, key, value):
+        try:
+            content = json.dumps(value)
+        except (TypeError, ValueError):
+            content = None
+        if content is None or json.loads(content) != value:
+            debug_print(f"Value of cache item {key} is not possible to store as JSON")
+            return
+        # write via temporary file, parallel runs could read incomplete file
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as tmp_fd:
+                tmp_fd.write(content)
+            os.replace(tmp_path, self._path(key))
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    def evict(self):
+        """ Remove least recently used items to fit max_size """
+        items = list()
+        total = 0
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                if entry.name.endswith(LEGACY_SUFFIXES):
+                    os.unlink(entry.path)
+                    continue
+                if not entry.name.endswith(CACHE_SUFFIX):
+                    continue
+                stat = entry.stat()
+                items.append((stat.st_mtime, stat.st_size, entry.path))
+                total += stat.st_size
+        items.sort()
+        removed = 0
+        while items and total > self.max_size:
+            _, size, path = items.pop(0)
+            os.unlink(path)
+            total -= size
+            removed += 1
+        debug_print(
+            f"Cache {self.directory}: {self.hits} hits, {self.misses} misses, "
+            f"{removed} items evicted"
+        )
+
+
+class MemoryCache(MetadataCache):
+    """ The same as MetadataCache, but items are kept in memory (watch mode) """
+
+    def __init__(self):
+        self.rebuild = False
+        self.version = package_version()
+        self.hits = 0
+        self.misses = 0
+        self.items = dict()
+
+    def get(self, key):
+        value = self.items.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        # stored data are updated by callers
+        return copy.deepcopy(value)
+
+    def set(self, key, value):
+        self.items[key] = copy.deepcopy(value)
+
+    def evict(self):
+        pass
+
+
+def default_cache(path, rebuild=False):
+    """ Cache inside FMF root of path, None in case there is no FMF tree """
+    try:
+        root = find_fmf_root(path)
+    except FMFError:
+        debug_print(f"No FMF root for {path}, cache disabled")
+        return None
+    return MetadataCache(os.path.join(root, CACHE_DIR), rebuild=rebuild)
@@ -1,20 +1,24 @@
 import argparse
-import yaml
-from fmf_metadata.base import (
-    yaml_fmf_output,
-    read_config,
-    debug_print,
-    dict_to_yaml,
-    get_test_files,
-    update_fmf_file,
-    StoreUpdater,
-    store_to_fmf_files,
-)
-from fmf_metadata.constants import MAIN_FMF, CONFIG_FMF_FILE, PYTEST_DEFAULT_CONF
-from fmf_metadata.pytest_collector import collect
+import fnmatch
+import os
+import sys
 
-# disable references inside yaml files
-setattr(yaml.SafeDumper, "ignore_aliases", lambda *args: True)
+# every mode imports just modules it needs (pytest is loaded just in pytest
+# mode, fmf just when FMF tree is read), see tests of CLI startup
+from fmf_metadata.constants import (
+    MAIN_FMF,
+    CONFIG_EXCLUDE,
+    CONFIG_FMF_FILE,
+    CONFIG_RECURSIVE,
+    CONFIG_TESTGLOBS,
+    CONFIG_TEST_PATH,
+    PRUNED_DIRS,
+    PYTEST_DEFAULT_CONF,
+    PYTEST_FILE_GLOBS,
+    TESTFILE_GLOBS,
+    TEST_PATH,
+    WRITE_JOBS,
+)
 
 
 def arg_parser():
@@ -58,32 +62,382 @@ def arg_parser():
         action="append",
         help="override post_mark for item elements (change to -)",
     )
+    parser.add_argument(
+        "--check",
+        dest="check",
+        action="store_true",
+        help="Do not write anything, print stale FMF nodes and exit with 1 if there are some",
+    )
     parser.add_argument(
         "--pytest",
         dest="pytest_mode",
         action="store_true",
         help="Use pytest test collector, instead of default unittest",
     )
+    parser.add_argument(
+        "-r",
+        "--recursive",
+        dest="recursive",
+        action="store_true",
+        default=None,
+        help="Search test files in subdirectories as well",
+    )
+    parser.add_argument(
+        "--exclude",
+        dest="exclude",
+        action="append",
+        help="Skip test files and directories matching pattern (.gitignore syntax)",
+    )
+    parser.add_argument(
+        "--static",
+        dest="static",
+        action="store_true",
+        help="Discover unittest tests by parsing sources instead of importing them",
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        dest="jobs",
+        action="store",
+        type=int,
+        default=1,
+        help="Process test files in N parallel processes (0 means number of CPUs)",
+    )
+    parser.add_argument(
+        "--write-jobs",
+        dest="write_jobs",
+        action="store",
+        type=int,
+        default=WRITE_JOBS,
+        help="Write FMF files in N parallel threads in pytest mode "
+        f"(default {WRITE_JOBS}, 1 means sequentially)",
+    )
+    parser.add_argument(
+        "--compact",
+        dest="compact",
+        action="store_true",
+        help="Move attributes shared by all tests of class (classes of file) to the class "
+        "(file) node, report size reduction",
+    )
+    parser.add_argument(
+        "--stream",
+        dest="stream",
+        action="store_true",
+        help="Write output incrementally, as soon as every test file is processed",
+    )
+    parser.add_argument(
+        "--cache",
+        dest="cache",
+        action="store_true",
+        help="Use cache of generated metadata (stored in .fmf/cache), "
+        "changes of modules imported by tests are not detected",
+    )
+    parser.add_argument(
+        "--rebuild-cache",
+        dest="rebuild_cache",
+        action="store_true",
+        help="Process all test files and store them to cache again (implies --cache)",
+    )
+    parser.add_argument(
+        "--watch",
+        dest="watch",
+        action="store_true",
+        help="Keep running and update FMF files whenever tests, config or FMF files change",
+    )
+    parser.add_argument(
+        "--profile",
+        dest="profile",
+        action="store_true",
+        help="Print time spent in phases of generation and slowest test files (JSON)",
+    )
+    parser.add_argument(
+        "--timings",
+        dest="timings",
+        action="store",
+        help="Store time spent in phases of generation to this file (JSON)",
+    )
 
     parser.add_argument("tests", nargs="*")
     return parser
 
 
+def print_differences(differences):
+    """ Print stale nodes, returns exit code """
+    from fmf_metadata.base import MISSING, debug_print
+
+    node_name = None
+    for name, key, current, expected in differences:
+        if name != node_name:
+            print(name)
+            node_name = name
+        if current is MISSING and isinstance(expected, dict):
+            print(f"    {key}: missing node")
+        else:
+            print(f"    {key}: {current!r} -> {expected!r}")
+    stale = len({item[0] for item in differences})
+    debug_print(f"Stale nodes: {stale}")
+    return 1 if stale else 0
+
+
+def watched_files(opts):
+    """
+    Test files and other files what have influence to generated metadata
+    (config file, FMF files, in pytest mode also conftest and helper modules)
+    """
+    from fmf_metadata.base import (
+        get_cached_tree,
+        get_test_files,
+        read_config,
+        tree_nodes,
+    )
+
+    config = read_config(opts.config) if opts.config else dict()
+    other_files = [opts.config] if opts.config else []
+    if not opts.pytest_mode:
+        test_files = get_test_files(
+            opts.fmf_path or config.get(CONFIG_TEST_PATH, TEST_PATH),
+            opts.tests or config.get(CONFIG_TESTGLOBS, TESTFILE_GLOBS),
+            recursive=(
+                config.get(CONFIG_RECURSIVE, False)
+                if opts.recursive is None
+                else opts.recursive
+            ),
+            exclude=opts.exclude or config.get(CONFIG_EXCLUDE, []),
+        )
+        other_files.append(opts.fmf_file or config.get(CONFIG_FMF_FILE, MAIN_FMF))
+    else:
+        test_files = list()
+        for item in get_test_files(
+            opts.fmf_path or ".",
+            opts.tests,
+            recursive=opts.recursive,
+            exclude=opts.exclude,
+        ):
+            if not os.path.isdir(item):
+                test_files.append(item)
+                continue
+            for dirpath, dirnames, filenames in os.walk(item):
+                dirnames[:] = sorted(set(dirnames) - set(PRUNED_DIRS))
+                for filename in sorted(filenames):
+                    if not filename.endswith(".py"):
+                        continue
+                    if any(
+                        fnmatch.fnmatch(filename, glob) for glob in PYTEST_FILE_GLOBS
+                    ):
+                        test_files.append(os.path.join(dirpath, filename))
+                    else:
+                        other_files.append(os.path.join(dirpath, filename))
+        for tree in {
+            get_cached_tree(os.path.dirname(os.path.abspath(item)))
+            for item in test_files
+        }:
+            for node in tree_nodes(tree).values():
+                other_files += node.sources
+    return (
+        [os.path.abspath(item) for item in test_files],
+        sorted({os.path.abspath(item) for item in other_files}),
+    )
+
+
+def local_module_files():
+    """
+    Python files of imported modules what are not installed (not in standard
+    library or site-packages), e.g. helper modules imported by tests
+    """
+    import sysconfig
+
+    installed = tuple(
+        os.path.join(os.path.realpath(sysconfig.get_path(name)), "")
+        for name in ("stdlib", "platstdlib", "purelib", "platlib")
+    ) + (
+        os.path.join(os.path.dirname(os.path.realpath(__file__)), ""),
+    )
+    output = set()
+    for module in list(sys.modules.values()):
+        filename = getattr(module, "__file__", None)
+        if not filename or not filename.endswith(".py"):
+            continue
+        filename = os.path.realpath(filename)
+        if not filename.startswith(installed):
+            output.add(filename)
+    return sorted(output)
+
+
+def _generate_isolated(opts, cache):
+    """
+    Worker of watch mode in new interpreter (modules imported by tests
+    are imported again), returns updated cache and local imported modules
+    """
+    generate(opts, cache=cache)
+    return cache, local_module_files()
+
+
+def watch_mode(opts):
+    """
+    Update FMF files and keep updating them whenever watched files change,
+    only changed test files are processed again (cached data of other files
+    are used, in pytest mode only changed test files are collected).
+    In unittest mode metadata are generated in new interpreter every time
+    and locally imported modules are watched as well, their change
+    (as well as change of other python files in pytest mode) rebuilds cache
+    """
+    from fmf_metadata.base import clear_tree_cache, debug_print
+    from fmf_metadata.cache import MemoryCache
+    from fmf_metadata.watch import watch
+
+    # in memory cache, unless cache on disk is used
+    cache = None if opts.cache or opts.rebuild_cache else MemoryCache()
+    local_modules = list()
+
+    def regenerate(test_files=None, rebuild=False):
+        nonlocal cache, local_modules
+        if rebuild:
+            debug_print("Imported python files changed, rebuild cache")
+            if cache is not None:
+                cache = MemoryCache()
+        run_opts = argparse.Namespace(**vars(opts))
+        run_opts.rebuild_cache = opts.rebuild_cache or rebuild
+        if opts.pytest_mode:
+            # pytest mode collects in new process already (isolated)
+            generate(run_opts, cache=cache, test_files=test_files)
+            return
+        import multiprocessing
+        from concurrent.futures import ProcessPoolExecutor
+
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+            cache, local_modules = executor.submit(
+                _generate_isolated, run_opts, cache
+            ).result()
+
+    def files():
+        test_files, other_files = watched_files(opts)
+        return test_files, sorted(set(other_files + local_modules))
+
+    regenerate()
+    test_files, other_files = files()
+
+    def update(changed):
+        nonlocal test_files, other_files
+        previous_tests = set(test_files)
+        previous_other = other_files
+        clear_tree_cache()
+        test_files, other_files = files()
+        changed = set(changed)
+        changed_tests = [
+            item for item in test_files if item in changed or item not in previous_tests
+        ]
+        changed_other = changed.intersection(previous_other + other_files)
+        # cache keys do not contain imported modules
+        rebuild = any(item.endswith(".py") for item in changed_other)
+        if changed_other or (changed_tests and not opts.pytest_mode):
+            regenerate(rebuild=rebuild)
+        elif changed_tests:
+            regenerate(test_files=changed_tests)
+        # local modules could be imported by changed tests
+        test_files, other_files = files()
+
+    debug_print("Watching for changes, stop by Ctrl+C")
+    try:
+        watch(lambda: test_files + other_files, update)
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
 def run():
-    opts = arg_parser().parse_args()
+    parser = arg_parser()
+    opts = parser.parse_args()
+    if opts.watch:
+        if opts.check:
+            parser.error("--watch can not be used together with --check")
+        # watch mode always stores data
+        opts.fmf_update = True
+        return watch_mode(opts)
+    if not (opts.profile or opts.timings):
+        return generate(opts)
+    from fmf_metadata.base import debug_print
+    from fmf_metadata.timings import Timings
+
+    if opts.pytest_mode:
+        # measured functions are replaced just in already imported modules
+        import fmf_metadata.pytest_collector  # noqa: F401
+
+    timings = Timings()
+    timings.start()
+    try:
+        return generate(opts)
+    finally:
+        timings.stop()
+        if opts.timings:
+            debug_print(f"Store timings: {opts.timings}")
+            with open(opts.timings, "w") as fd:
+                fd.write(timings.to_json())
+        if opts.profile:
+            debug_print(timings.to_json())
+
+
+def generate(opts, cache=None, test_files=None):
+    """
+    Generate metadata selected by options, cache replaces cache selected
+    by options, test_files limits pytest mode to these test files
+    """
+    from fmf_metadata.base import (
+        atomic_write,
+        debug_print,
+        dict_to_yaml,
+        fmf_output_items,
+        get_test_files,
+        node_differences,
+        read_config,
+        read_fmf_file,
+        store_to_fmf_files,
+        stale_fmf_nodes,
+        yaml_chunks,
+        yaml_fmf_output,
+    )
+    from fmf_metadata.cache import default_cache
+
     config = dict()
     if opts.config:
         config = read_config(opts.config)
+    if cache is None and (opts.cache or opts.rebuild_cache):
+        test_path = opts.fmf_path or (
+            config.get(CONFIG_TEST_PATH, TEST_PATH) if not opts.pytest_mode else "."
+        )
+        cache = default_cache(test_path, rebuild=opts.rebuild_cache)
     if not opts.pytest_mode:
         fmf_file = opts.fmf_file or config.get(CONFIG_FMF_FILE, MAIN_FMF)
-        data = yaml_fmf_output(
+        generator_args = dict(
             fmf_file=opts.fmf_file,
             path=opts.fmf_path,
             testfile_globs=opts.tests,
             config=config,
             merge_minus_list=opts.merge_minus,
             merge_plus_list=opts.merge_plus,
+            static=opts.static,
+            jobs=opts.jobs,
+            cache=cache,
+            recursive=opts.recursive,
+            exclude=opts.exclude,
+            compact=opts.compact,
         )
+        if opts.check:
+            data = yaml_fmf_output(**generator_args)
+            return print_differences(node_differences(data, read_fmf_file(fmf_file)))
+        if opts.stream:
+            chunks = yaml_chunks(fmf_output_items(**generator_args))
+            if opts.fmf_update:
+                debug_print(f"Update FMF file: {fmf_file}")
+                with atomic_write(fmf_file) as fd:
+                    fd.writelines(chunks)
+            else:
+                for chunk in chunks:
+                    sys.stdout.write(chunk)
+                    sys.stdout.flush()
+                print()
+            return
+        data = yaml_fmf_output(**generator_args)
         if opts.fmf_update:
             debug_print(f"Update FMF file: {fmf_file}")
             with open(fmf_file, "w") as fd:
@@ -91,17 +445,30 @@ def run():
         else:
             print(dict_to_yaml(data))
     else:
+        from fmf_metadata.pytest_collector import pytest_fmf_output
+
         debug_print("Using PYTEST collector")
         pytest_params = list()
-        for item in get_test_files(opts.fmf_path or ".", opts.tests):
+        for item in test_files or get_test_files(
+            opts.fmf_path or ".",
+            opts.tests,
+            recursive=opts.recursive,
+            exclude=opts.exclude,
+        ):
             pytest_params.append(item)
-        out = StoreUpdater()
-        for item in collect(pytest_params):
-            update_fmf_file(item, config=config or PYTEST_DEFAULT_CONF, write_dict=out)
-            debug_print(f"Processing Item: {item}")
-
-        store_to_fmf_files(out, opts.fmf_update)
+        out = pytest_fmf_output(
+            pytest_params,
+            config=config or PYTEST_DEFAULT_CONF,
+            cache=cache,
+            jobs=opts.jobs,
+            # test modules are imported again in every update of watch mode
+            isolated=opts.watch,
+            compact=opts.compact,
+        )
+        if opts.check:
+            return print_differences(stale_fmf_nodes(out))
+        store_to_fmf_files(out, opts.fmf_update, jobs=opts.write_jobs)
 
 
 if __name__ == "__main__":
-    run()
+    sys.exit(run())
@@ -0,0 +1,197 @@
+import copy
+
+from fmf_metadata.base import (
+    FMFError,
+    _ATTRIBUTE_KEYS,
+    _postfixed_keys,
+    debug_print,
+    dict_to_yaml,
+)
+from fmf_metadata.constants import (
+    CONFIG_ADDITIONAL_KEY,
+    FMF_COMPACTED_NODE,
+    FMF_POSTFIX,
+)
+
+# compaction of generated FMF data: attributes what all child nodes have
+# (the same key including merging postfix and the same value) are moved
+# to the parent node, child nodes inherit them via FMF inheritance.
+# Just generated attributes are moved, moved keys are recorded in child node
+# FMF_COMPACTED_NODE, so they are moved back to child nodes (see
+# expand_compacted) before FMF data are updated, other attributes
+# of the node are never changed.
+
+
+def generated_keys(config):
+    """ FMF keys (with merging postfixes) what are generated for tests """
+    return frozenset(
+        _postfixed_keys(
+            _ATTRIBUTE_KEYS + tuple(config.get(CONFIG_ADDITIONAL_KEY, {}).values())
+        )
+    )
+
+
+def _is_node(key, value):
+    """ Child node, record of compaction and FMF directives are not nodes """
+    return (
+        key.startswith("/")
+        and key not in ("/", FMF_COMPACTED_NODE)
+        and isinstance(value, dict)
+    )
+
+
+def _compacted_keys(node):
+    record = node.get(FMF_COMPACTED_NODE)
+    keys = record.get("keys") if isinstance(record, dict) else None
+    return keys if isinstance(keys, list) else []
+
+
+def _same_value(first, second):
+    """ Equality what does not mix types (True == 1 in python, not in FMF) """
+    if type(first) is not type(second):
+        return False
+    if isinstance(first, dict):
+        return first.keys() == second.keys() and all(
+            _same_value(value, second[key]) for key, value in first.items()
+        )
+    if isinstance(first, list):
+        return len(first) == len(second) and all(
+            _same_value(*pair) for pair in zip(first, second)
+        )
+    return first == second
+
+
+def _variants(key):
+    name = key.rstrip("".join(FMF_POSTFIX))
+    return [name + postfix for postfix in FMF_POSTFIX]
+
+
+def _hoistable(key, children, node):
+    """
+    Key can be moved to node if all children have it with the same value
+    and neither node nor children have the key with other merging postfix
+    """
+    variants = _variants(key)
+    if any(variant in node for variant in variants):
+        return False
+    value = children[0][key]
+    for child in children:
+        if key not in child or not _same_value(child[key], value):
+            return False
+        if any(variant in child for variant in variants if variant != key):
+            return False
+    return True
+
+
+def compact_fmf_dict(node, keys):
+    """
+    Copy of FMF data of node, where keys shared by all (at least two) child
+    nodes are moved to node, from leaves up (tests to class, classes to file).
+    Moved keys are recorded in FMF_COMPACTED_NODE child of the node.
+    Resolved data of leaf nodes are the same (see check_compaction)
+    """
+    attributes = dict()
+    children = dict()
+    for key, value in node.items():
+        if _is_node(key, value):
+            children[key] = compact_fmf_dict(value, keys)
+        else:
+            attributes[key] = value
+    # nothing is saved by moving attributes of the only child
+    if len(children) > 1:
+        child_list = list(children.values())
+        hoisted = list()
+        for key in list(child_list[0]):
+            if key in keys and _hoistable(key, child_list, attributes):
+                attributes[key] = child_list[0][key]
+                hoisted.append(key)
+                for child in child_list:
+                    del child[key]
+        if hoisted:
+            attributes[FMF_COMPACTED_NODE] = {
+                "/": {"select": False},
+                "keys": sorted(hoisted),
+            }
+    attributes.update(children)
+    return attributes
+
+
+def expand_compacted(node):
+    """
+    Move attributes recorded by compaction back to child nodes (in place),
+    from the top, so they get to the same nodes as they were generated for.
+    Resolved data of leaf nodes are the same, records are removed
+    """
+    children = [value for key, value in node.items() if _is_node(key, value)]
+    for key in _compacted_keys(node):
+        if key not in node:
+            continue
+        value = node.pop(key)
+        for child in children:
+            if not any(variant in child for variant in _variants(key)):
+                child[key] = copy.deepcopy(value)
+    node.pop(FMF_COMPACTED_NODE, None)
+    for child in children:
+        expand_compacted(child)
+
+
+def resolved_leaves(data, parent=None):
+    """
+    Data of leaf nodes (with inherited attributes) of FMF data, name -> data,
+    parent is resolved data of node what data are in (FMF tree above them)
+    """
+    import fmf
+
+    tree_data = dict(parent or {})
+    tree_data.update(copy.deepcopy(data))
+    return {node.name: node.data for node in fmf.Tree(tree_data).climb()}
+
+
+def check_compaction(original, compacted, parent=None):
+    """ Raise FMFError in case leaf nodes of compacted data are not the same """
+    if resolved_leaves(original, parent) != resolved_leaves(compacted, parent):
+        raise FMFError("Compacted FMF data differ from original data (leaf nodes)")
+
+
+class Compaction:
+    """
+    Compaction of FMF data, every result is checked (resolved data of leaf
+    nodes are the same) and its size (as YAML) is counted for the report
+    """
+
+    def __init__(self, config):
+        self.keys = generated_keys(config)
+        self.size = 0
+        self.compacted_size = 0
+
+    def node(self, name, data, parent=None):
+        """
+        Compacted data of node name (relative to FMF tree with parent data,
+        see resolved_leaves)
+        """
+        compacted = compact_fmf_dict(data, self.keys)
+        self._checked({name: data}, {name: compacted}, parent)
+        return compacted
+
+    def children(self, data, parent=None):
+        """ Compacted data where attributes are moved just to child nodes """
+        compacted = dict()
+        for key, value in data.items():
+            compacted[key] = (
+                compact_fmf_dict(value, self.keys) if _is_node(key, value) else value
+            )
+        self._checked(data, compacted, parent)
+        return compacted
+
+    def _checked(self, original, compacted, parent=None):
+        check_compaction(original, compacted, parent)
+        self.size += len(dict_to_yaml(original))
+        self.compacted_size += len(dict_to_yaml(compacted))
+
+    def report(self):
+        saved = self.size - self.compacted_size
+        percent = 100.0 * saved / self.size if self.size else 0.0
+        debug_print(
+            f"Compaction: {self.size} -> {self.compacted_size} bytes of YAML "
+            f"({percent:.1f}% smaller)"
+        )
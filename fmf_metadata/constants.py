@@ -43,6 +43,15 @@ FMF_ATTRIBUTES = {
 }
 FMF_ATTR_PREFIX = "_fmf__"
 FMF_POSTFIX = ("+", "-", "")
+# function attribute with all FMF attributes set by decorators
+FMF_REGISTRY = "__fmf_registry__"
+# function attribute with FMF data of the function computed by test_data_dict
+FMF_DATA_CACHE = "__fmf_data__"
+# class attribute with FMF attributes set by class decorators
+FMF_CLASS_METADATA = "__fmf_class_metadata__"
+# child node with keys of attributes moved to the node by compaction,
+# it is not selected (it is not a test) and it is not inherited by tests
+FMF_COMPACTED_NODE = "/compacted-keys"
 
 CONFIG_ADDITIONAL_KEY = "additional_keys"
 CONFIG_POSTPROCESSING_TEST = "test_postprocessing"
@@ -51,13 +60,42 @@ CONFIG_TEST_PATH = "test_path"
 CONFIG_FMF_FILE = "fmf_file"
 CONFIG_MERGE_PLUS = "merge_plus"
 CONFIG_MERGE_MINUS = "merge_minus"
+CONFIG_RECURSIVE = "recursive"
+CONFIG_EXCLUDE = "exclude"
 ENV_REGENERATE_FMF = "REGENERATE_FMF"
+FMF_ROOT_DIR = ".fmf"
+CACHE_DIR = os.path.join(FMF_ROOT_DIR, "cache")
+# maximal size of cache directory in bytes
+CACHE_MAX_SIZE = 64 * 1024 * 1024
+# files with .gitignore style patterns of paths excluded from recursive discovery
+IGNORE_FILES = (".gitignore", ".fmfignore")
+# directories never searched for tests by recursive discovery
+PRUNED_DIRS = (
+    "__pycache__",
+    ".git",
+    ".hg",
+    ".svn",
+    ".tox",
+    ".nox",
+    ".venv",
+    "venv",
+    ".eggs",
+    ".pytest_cache",
+    ".mypy_cache",
+    FMF_ROOT_DIR,
+)
+# file in root of python virtual environment
+VENV_MARKER = "pyvenv.cfg"
+# default python_files of pytest, other python files are e.g. conftest files
+PYTEST_FILE_GLOBS = ("test_*.py", "*_test.py")
+# watch mode: seconds between checks when inotify is not available
+WATCH_INTERVAL = 1.0
+# watch mode: changes within this time (seconds) are handled by one update
+WATCH_DEBOUNCE = 0.3
+# threads writing FMF files (pytest mode updates FMF files in many directories)
+WRITE_JOBS = 8
 
-PYTEST_DEFAULT_CONF = {
-    CONFIG_POSTPROCESSING_TEST: {
-        "test": """
+PYTEST_DEFAULT_CONF = {CONFIG_POSTPROCESSING_TEST: {"test": """
 cls_str = ("::" + str(cls.name)) if cls.name else ""
 escaped = shlex.quote(f"{filename}{cls_str}::{test.name}")
-f"python3 -m pytest -m '' -v {escaped}" """
-    }
-}
+f"python3 -m pytest -m '' -v {escaped}" """}}
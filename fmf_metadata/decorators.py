@@ -0,0 +1,389 @@
+import copy
+import sys
+import types
+
+from fmf_metadata.constants import (
+    ENVIRONMENT_KEY,
+    FMF_ATTR_PREFIX,
+    FMF_CLASS_METADATA,
+    FMF_ATTRIBUTES,
+    FMF_DATA_CACHE,
+    FMF_POSTFIX,
+    FMF_REGISTRY,
+    TEST_METHOD_PREFIX,
+)
+
+# FMF decorators, imported by test modules, so it does not import anything
+# else (fmf, yaml, unittest), generator machinery is in fmf_metadata.base
+
+
+class Error(Exception):
+    def __init__(self, msg):
+        self.msg = msg
+
+    def __str__(self):
+        return self.msg
+
+
+class FMFError(Error):
+    pass
+
+
+def is_test_function(member):
+    return isinstance(member, types.FunctionType) and member.__name__.startswith(
+        TEST_METHOD_PREFIX
+    )
+
+
+def fmf_registry(item):
+    """
+    FMF attributes set by decorators to item (function), attribute name
+    (without merging postfix) -> (postfix, value)
+    """
+    return getattr(item, "__dict__", {}).get(FMF_REGISTRY, {})
+
+
+class _ClassMetadata:
+    """
+    FMF attributes set by decorators to test class (in registry like functions)
+    and how they are merged with attributes of functions (list, dict or None
+    if value of function is kept), version is increased by every decorator,
+    data computed before are invalid
+    """
+
+    def __init__(self):
+        self.merging = dict()
+        self.version = 0
+
+
+def _merging(value, base_type):
+    """ How __set_method_attribute merges value of attribute with existing one """
+    if base_type is None:
+        if isinstance(value, (list, tuple)):
+            return list
+        return dict if isinstance(value, dict) else None
+    if isinstance(base_type, tuple) and base_type[0] in [tuple, list]:
+        return list
+    return dict if base_type in [dict] else None
+
+
+def fmf_class_metadata(test_class, function):
+    """
+    Metadata of class decorators what apply to function of test_class in order
+    of application: from the class defining function to test_class.
+    Classes what do not inherit the defining class (other mixins) are skipped
+    """
+    if not isinstance(test_class, type):
+        return ()
+    found = [
+        (item, item.__dict__[FMF_CLASS_METADATA])
+        for item in test_class.__mro__
+        if FMF_CLASS_METADATA in item.__dict__
+    ]
+    if not found:
+        return ()
+    for item in test_class.__mro__:
+        members = item.__dict__
+        if members.get(function.__name__) is function or any(
+            member is function for member in members.values()
+        ):
+            return tuple(
+                metadata
+                for item_class, metadata in reversed(found)
+                if issubclass(item_class, item)
+            )
+    return ()
+
+
+def fmf_merged_registry(function, class_metadata):
+    """
+    Registry of function merged with registries of class decorators (see
+    fmf_class_metadata) the same way as decorators set attributes: values
+    of function are first in lists, they win in dictionaries and other types
+    """
+    registry = fmf_registry(function)
+    for metadata in class_metadata:
+        merged = None
+        for attribute, (post_mark, value) in fmf_registry(metadata).items():
+            current = fmf_attribute(function, attribute, registry=registry)
+            if current is None:
+                # every function has own value, as it had by class decorators
+                # applied to functions (shared values are YAML aliases)
+                merged_value = copy.copy(value)
+            elif current[0] != post_mark:
+                raise FMFError(
+                    "you are mixing various post_marks for {} ({} already exists)".format(
+                        function, attribute + current[0]
+                    )
+                )
+            elif metadata.merging.get(attribute) is list:
+                merged_value = current[1] + value
+            elif metadata.merging.get(attribute) is dict:
+                merged_value = dict(value)
+                merged_value.update(current[1])
+            else:
+                continue
+            if merged is None:
+                merged = dict(registry)
+            merged[attribute] = (post_mark, merged_value)
+        registry = merged or registry
+    return registry
+
+
+def fmf_attribute(item, attribute, registry=None):
+    """ Return (postfix, value) of attribute of item, None if not defined """
+    registry = fmf_registry(item) if registry is None else registry
+    found = registry.get(attribute)
+    if found is not None or attribute.startswith(FMF_ATTR_PREFIX):
+        return found
+    # attributes set directly by other decorators (e.g. config additional_keys)
+    for postfix in FMF_POSTFIX:
+        value = getattr(item, attribute + postfix, None)
+        if value is not None:
+            return postfix, value
+    return None
+
+
+def __store_attribute(item, attribute, post_mark, value):
+    item.__dict__.pop(FMF_DATA_CACHE, None)
+    registry = item.__dict__.get(FMF_REGISTRY)
+    if registry is None:
+        registry = dict()
+        setattr(item, FMF_REGISTRY, registry)
+    registry[sys.intern(attribute)] = (post_mark, value)
+    # keep attribute readable as well
+    setattr(item, attribute + post_mark, value)
+
+
+def __set_method_attribute(item, attribute, value, post_mark, base_type=None):
+    # FMF data computed by test_data_dict are not valid anymore
+    item.__dict__.pop(FMF_DATA_CACHE, None)
+    if post_mark not in FMF_POSTFIX:
+        raise FMFError("as postfix you can use + or - or let it empty (FMF merging)")
+    current = fmf_attribute(item, attribute)
+    if current is not None and current[0] != post_mark:
+        raise FMFError(
+            "you are mixing various post_marks for {} ({} already exists)".format(
+                item, attribute + current[0]
+            )
+        )
+    if base_type is None:
+        if isinstance(value, list) or isinstance(value, tuple):
+            base_type = (list,)
+        elif isinstance(value, dict):
+            base_type = dict
+            value = [value]
+        else:
+            value = [value]
+
+    if isinstance(base_type, tuple) and base_type[0] in [tuple, list]:
+        if current is None:
+            current = (post_mark, list())
+            __store_attribute(item, attribute, post_mark, current[1])
+        # check expected object types for FMF attributes
+        for value_item in value:
+            if len(base_type) > 1 and not isinstance(value_item, tuple(base_type[1:])):
+                raise FMFError(
+                    "type {} (value:{}) is not allowed, please use: {} ".format(
+                        type(value_item), value_item, base_type[1:]
+                    )
+                )
+        current[1].extend(list(value))
+        return
+
+    # use just first value in case you don't use list of tuple
+    if len(value) > 1:
+        raise FMFError(
+            "It is not permitted for {} (type:{}) put multiple values ({})".format(
+                attribute, base_type, value
+            )
+        )
+    first_value = value[0]
+    if base_type and not isinstance(first_value, base_type):
+        raise FMFError(
+            "type {} (value:{}) is not allowed, please use: {} ".format(
+                type(first_value), first_value, base_type
+            )
+        )
+    if base_type in [dict]:
+        if current is not None:
+            first_value.update(current[1])
+    elif current is not None:
+        # if it is already defined (not list types or dict) exit
+        # class decorators are applied right after, does not make sense to rewrite more specific
+        # dict updating is reversed
+        return
+    __store_attribute(item, attribute, post_mark, first_value)
+
+
+def __set_class_attribute(test_class, attribute, value, post_mark, base_type=None):
+    # recorded once per class, test functions get it via fmf_merged_registry
+    metadata = test_class.__dict__.get(FMF_CLASS_METADATA)
+    if metadata is None:
+        metadata = _ClassMetadata()
+        setattr(test_class, FMF_CLASS_METADATA, metadata)
+    __set_method_attribute(
+        metadata, attribute, value, post_mark=post_mark, base_type=base_type
+    )
+    metadata.merging[sys.intern(attribute)] = _merging(value, base_type)
+    metadata.version += 1
+
+
+def set_obj_attribute(
+    testEntity,
+    attribute,
+    value,
+    raise_text=None,
+    base_class=None,
+    base_type=None,
+    post_mark="",
+):
+    if base_class is None:
+        # default is unittest.TestCase, no class inherits it if it is not imported
+        unittest = sys.modules.get("unittest")
+        base_class = unittest.TestCase if unittest is not None else ()
+    if isinstance(testEntity, type) and issubclass(testEntity, base_class):
+        __set_class_attribute(
+            testEntity, attribute, value, post_mark=post_mark, base_type=base_type
+        )
+    elif is_test_function(testEntity):
+        __set_method_attribute(
+            testEntity, attribute, value, base_type=base_type, post_mark=post_mark
+        )
+    elif raise_text:
+        raise FMFError(raise_text)
+    return testEntity
+
+
+def generic_metadata_setter(
+    attribute,
+    value,
+    raise_text=None,
+    base_class=None,
+    base_type=None,
+    post_mark="",
+):
+    def inner(testEntity):
+        return set_obj_attribute(
+            testEntity,
+            attribute,
+            value,
+            raise_text,
+            base_class,
+            base_type=base_type,
+            post_mark=post_mark,
+        )
+
+    return inner
+
+
+def fmf_prefixed_name(name):
+    return FMF_ATTR_PREFIX + name
+
+
+class __FMFMeta(type):
+    @staticmethod
+    def _set_fn(name, base_type=None):
+        if name not in FMF_ATTRIBUTES:
+            raise FMFError(
+                "fmf decorator {} not found in {}".format(name, FMF_ATTRIBUTES.keys())
+            )
+
+        def inner(*args, post_mark=""):
+            return generic_metadata_setter(
+                fmf_prefixed_name(name),
+                args,
+                base_type=base_type or FMF_ATTRIBUTES[name],
+                post_mark=post_mark,
+            )
+
+        return inner
+
+    def __getattr__(cls, name):
+        return cls._set_fn(name)
+
+
+class FMF(metaclass=__FMFMeta):
+    """
+    This class implements class decorators for TMT semantics via dynamic class methods
+    see https://tmt.readthedocs.io/en/latest/spec/tests.html
+    """
+
+    @classmethod
+    def tag(cls, *args, post_mark=""):
+        """
+        generic purpose test tags to be used (e.g. "slow", "fast", "security")
+        https://tmt.readthedocs.io/en/latest/spec/tests.html#tag
+        """
+        return cls._set_fn("tag", base_type=FMF_ATTRIBUTES["tag"])(
+            *args, post_mark=post_mark
+        )
+
+    @classmethod
+    def link(cls, *args, post_mark=""):
+        """
+        generic url links (default is verify) but could contain more see TMT doc
+        https://tmt.readthedocs.io/en/latest/spec/core.html#link
+        """
+        return cls._set_fn("link", base_type=FMF_ATTRIBUTES["link"])(
+            *args, post_mark=post_mark
+        )
+
+    @classmethod
+    def bug(cls, *args, post_mark=""):
+        """
+        link to relevant bugs what this test verifies.
+        It can be link to issue tracker or bugzilla
+        https://tmt.readthedocs.io/en/latest/spec/tests.html#link
+        """
+        return cls.link(*[{"verifies": arg} for arg in args], post_mark=post_mark)
+
+    @classmethod
+    def adjust(
+        cls, when, because=None, continue_execution=True, post_mark="", **kwargs
+    ):
+        """
+        adjust testcase execution, see TMT specification
+        https://tmt.readthedocs.io/en/latest/spec/core.html#adjust
+
+        if key value arguments are passed they are applied as update of the dictionary items
+        else disable test execution as default option
+
+        e.g.
+
+        @adjust("distro ~< centos-6", "The test is not intended for less than centos-6")
+        @adjust("component == bash", "modify component", component="shell")
+
+        tricky example with passing merging variables as kwargs to code
+        because python does not allow to do parameter as X+="something"
+        use **dict syntax for parameter(s)
+
+        @adjust("component == bash", "append env variable", **{"environment+": {"BASH":true}})
+        """
+        adjust_item = dict()
+        adjust_item["when"] = when
+        if because is not None:
+            adjust_item["because"] = because
+        if kwargs:
+            adjust_item.update(kwargs)
+        else:
+            adjust_item["enabled"] = False
+        if continue_execution is False:
+            adjust_item["continue"] = False
+        return cls._set_fn("adjust", base_type=FMF_ATTRIBUTES["adjust"])(
+            adjust_item, post_mark=post_mark
+        )
+
+    @classmethod
+    def environment(cls, post_mark="", **kwargs):
+        """
+        environment testcase execution, see TMT specification
+        https://tmt.readthedocs.io/en/latest/spec/test.html#environment
+
+        add environment keys
+        example:
+        @environment(PYTHONPATH=".", DATA_DIR="test_data")
+        """
+        return cls._set_fn(ENVIRONMENT_KEY, base_type=FMF_ATTRIBUTES[ENVIRONMENT_KEY])(
+            kwargs, post_mark=post_mark
+        )
@@ -0,0 +1,143 @@
+import os
+import re
+from typing import List
+
+from fmf_metadata.constants import IGNORE_FILES, PRUNED_DIRS, VENV_MARKER
+
+# recursive discovery of test files, all patterns are evaluated in one walk
+# via os.scandir, patterns use .gitignore syntax
+
+
+def glob_to_regex(pattern):
+    """
+    Translate glob to regular expression, * and ? do not match /,
+    ** matches any number of directories
+    """
+    output = list()
+    index = 0
+    while index < len(pattern):
+        char = pattern[index]
+        if pattern.startswith("**/", index):
+            output.append("(?:.*/)?")
+            index += 3
+            continue
+        if pattern.startswith("**", index):
+            output.append(".*")
+            index += 2
+            continue
+        if char == "*":
+            output.append("[^/]*")
+        elif char == "?":
+            output.append("[^/]")
+        elif char == "[" and pattern.find("]", index + 2) != -1:
+            start = index + 1
+            end = pattern.index("]", index + 2)
+            content = pattern[start:end].replace("\\", "\\\\")
+            if content.startswith("!"):
+                content = "^" + content[1:]
+            output.append(f"[{content}]")
+            index = end + 1
+            continue
+        elif char == "\\" and index + 1 < len(pattern):
+            output.append(re.escape(pattern[index + 1]))
+            index += 2
+            continue
+        else:
+            output.append(re.escape(char))
+        index += 1
+    return "".join(output)
+
+
+class PathPattern:
+    """
+    One .gitignore style pattern, base is directory (relative to root of walk)
+    where the pattern is defined. Pattern without / (except trailing one)
+    matches name in any directory, trailing / matches only directories
+    """
+
+    def __init__(self, pattern, base=""):
+        self.pattern = pattern
+        self.negate = pattern.startswith("!")
+        if self.negate:
+            pattern = pattern[1:]
+        elif pattern.startswith("\\"):
+            pattern = pattern[1:]
+        self.dir_only = pattern.endswith("/")
+        pattern = pattern.rstrip("/")
+        regex = glob_to_regex(pattern.lstrip("/"))
+        if "/" not in pattern:
+            regex = "(?:.*/)?" + regex
+        if base:
+            regex = re.escape(base) + "/" + regex
+        self.regex = re.compile(regex + r"\Z")
+
+    def match(self, relative, is_dir=False):
+        if self.dir_only and not is_dir:
+            return False
+        return self.regex.match(relative) is not None
+
+    def __repr__(self):
+        return f"PathPattern({self.pattern!r})"
+
+
+def read_ignore_file(path, base=""):
+    """ Patterns of .gitignore style file """
+    output = list()
+    with open(path) as fd:
+        for line in fd:
+            line = line.rstrip("\n")
+            if not line.endswith("\\ "):
+                line = line.rstrip()
+            if not line or line.startswith("#"):
+                continue
+            output.append(PathPattern(line, base))
+    return output
+
+
+def is_ignored(patterns, relative, is_dir=False):
+    """ The last matching pattern decides, negated pattern includes path again """
+    ignored = False
+    for pattern in patterns:
+        if pattern.match(relative, is_dir):
+            ignored = not pattern.negate
+    return ignored
+
+
+def scan_test_files(
+    path, testfile_globs, exclude=None, ignore_files=IGNORE_FILES
+) -> List[str]:
+    """
+    Find files matching some of testfile_globs in path and its subdirectories,
+    except excluded ones (exclude patterns and patterns from ignore files).
+    Returns sorted list of paths without duplicates
+    """
+    matchers = [PathPattern(item) for item in testfile_globs]
+    output = list()
+    directories = [("", [PathPattern(item) for item in exclude or []])]
+    while directories:
+        relative_dir, patterns = directories.pop()
+        with os.scandir(os.path.join(path, relative_dir)) as entries:
+            entries = list(entries)
+        names = {entry.name for entry in entries}
+        if relative_dir and VENV_MARKER in names:
+            # virtual environment with unknown name
+            continue
+        for ignore_file in ignore_files:
+            if ignore_file in names:
+                patterns = patterns + read_ignore_file(
+                    os.path.join(path, relative_dir, ignore_file), relative_dir
+                )
+        for entry in entries:
+            relative = f"{relative_dir}/{entry.name}" if relative_dir else entry.name
+            if entry.is_dir(follow_symlinks=False):
+                if entry.name not in PRUNED_DIRS and not is_ignored(
+                    patterns, relative, is_dir=True
+                ):
+                    directories.append((relative, patterns))
+            elif (
+                entry.is_file()
+                and any(matcher.match(relative) for matcher in matchers)
+                and not is_ignored(patterns, relative)
+            ):
+                output.append(os.path.join(path, relative))
+    return sorted(output)
@@ -1,5 +1,30 @@
+import os
+import pickle
+import subprocess
+import sys
+import tempfile
+import types
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
 import pytest
-from fmf_metadata.base import FMF
+from fmf_metadata.base import (
+    FMF,
+    FMFError,
+    StoreUpdater,
+    FMF_DATA_CACHE,
+    FMF_REGISTRY,
+    _update_fmf_file,
+    cached_realpath,
+    debug_print,
+    fmf_class_metadata,
+    fmf_merged_registry,
+    get_cached_tree,
+    resolve_config,
+    tree_layout,
+    tree_nodes,
+)
+from fmf_metadata.compaction import Compaction
 
 # current solution based on https://github.com/pytest-dev/pytest/discussions/8554
 
@@ -9,14 +34,24 @@ class ItemsCollector:
         self.items = items[:]
 
 
-def collect(opts):
-    plugin_col = ItemsCollector()
-    pytest.main(
-        ["--collect-only", "-pno:terminal", "-m", ""] + opts, plugins=[plugin_col]
-    )
-    for item in plugin_col.items:
+def apply_markers(items):
+    """
+    Store pytest markers of items as FMF attributes of test functions,
+    every marker is applied to function just once (parametrized items
+    share the function)
+    """
+    applied = dict()
+    for item in items:
         func = item.function
-        for marker in item.iter_markers():
+        markers = list(item.iter_markers())
+        done = applied.get(func)
+        if done is None:
+            applied[func] = markers
+        else:
+            # markers of parameter set (pytest.param(..., marks=...))
+            markers = [marker for marker in markers if marker not in done]
+            done.extend(markers)
+        for marker in markers:
             key = marker.name
             args = marker.args
             kwargs = marker.kwargs
@@ -37,4 +72,271 @@ def collect(opts):
             else:
                 # generic mark store as tag
                 FMF.tag(key)(func)
+
+
+def collect(opts):
+    plugin_col = ItemsCollector()
+    pytest.main(
+        ["--collect-only", "-pno:terminal", "-m", ""] + opts, plugins=[plugin_col]
+    )
+    apply_markers(plugin_col.items)
     return plugin_col.items
+
+
+def _placeholder():
+    pass
+
+
+@lru_cache(maxsize=None)
+def _placeholder_class(name):
+    return type(name, (), dict(__module__="non_important"))
+
+
+class CollectedFunction:
+    """
+    Picklable test function, it is replaced by placeholder with the same name,
+    docstring and attributes set by decorators. One record is shared by all
+    items of the function (parametrized tests)
+    """
+
+    __slots__ = ("name", "doc", "attributes", "_function")
+
+    def __init__(self, name, doc, attributes):
+        self.name = name
+        self.doc = doc
+        self.attributes = attributes
+        self._function = None
+
+    @classmethod
+    def from_function(cls, function, test_class=None):
+        """ Attributes of class decorators of test_class are merged to function """
+        attributes = dict()
+        for key, value in vars(function).items():
+            if key == FMF_DATA_CACHE:
+                continue
+            try:
+                pickle.dumps(value)
+            except Exception:
+                continue
+            attributes[key] = value
+        class_metadata = fmf_class_metadata(test_class, function)
+        if class_metadata:
+            # placeholder class has no decorators
+            attributes[FMF_REGISTRY] = fmf_merged_registry(function, class_metadata)
+        return cls(function.__name__, function.__doc__, attributes)
+
+    @property
+    def function(self):
+        if self._function is None:
+            function = types.FunctionType(_placeholder.__code__, {}, self.name)
+            function.__doc__ = self.doc
+            function.__dict__.update(self.attributes)
+            self._function = function
+        return self._function
+
+    def __getstate__(self):
+        return self.name, self.doc, self.attributes
+
+    def __setstate__(self, state):
+        self.name, self.doc, self.attributes = state
+        self._function = None
+
+
+class CollectedItem:
+    """
+    Picklable description of collected pytest item, what is needed
+    for FMF generation
+    """
+
+    __slots__ = (
+        "nodeid",
+        "name",
+        "fspath",
+        "cls_name",
+        "collected_function",
+        "markers",
+    )
+
+    def __init__(self, nodeid, name, fspath, cls_name, collected_function, markers):
+        self.nodeid = nodeid
+        self.name = name
+        self.fspath = fspath
+        self.cls_name = cls_name
+        self.collected_function = collected_function
+        self.markers = markers
+
+    @classmethod
+    def from_item(cls, item, functions=None):
+        """ functions (dictionary) shares function records between items """
+        functions = dict() if functions is None else functions
+        # inherited function gets decorators of every class separately
+        key = (item.function, item.cls)
+        collected_function = functions.get(key)
+        if collected_function is None:
+            collected_function = CollectedFunction.from_function(
+                item.function, item.cls
+            )
+            functions[key] = collected_function
+        return cls(
+            nodeid=item.nodeid,
+            name=item.name,
+            # the same strings for all items of file (class), pickled just once
+            fspath=sys.intern(str(item.fspath)),
+            cls_name=sys.intern(item.cls.__name__) if item.cls else None,
+            collected_function=collected_function,
+            markers=tuple(sys.intern(marker.name) for marker in item.iter_markers()),
+        )
+
+    @property
+    def cls(self):
+        return _placeholder_class(self.cls_name) if self.cls_name else None
+
+    @property
+    def function(self):
+        return self.collected_function.function
+
+    def __getstate__(self):
+        return tuple(getattr(self, name) for name in self.__slots__)
+
+    def __setstate__(self, state):
+        for name, value in zip(self.__slots__, state):
+            setattr(self, name, value)
+
+    def __repr__(self):
+        return f"<CollectedItem {self.nodeid}>"
+
+
+def collect_to_file(output, opts):
+    """ Collect items and store them (list of CollectedItem) to output file """
+    functions = dict()
+    items = [CollectedItem.from_item(item, functions) for item in collect(opts)]
+    with open(output, "wb") as fd:
+        pickle.dump(items, fd, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def _collect_shard(shard):
+    """ Collect shard in new python process, returns (items, error message) """
+    fd, output = tempfile.mkstemp(suffix=".pickle")
+    os.close(fd)
+    try:
+        process = subprocess.run(
+            [sys.executable, "-m", __name__, output] + shard,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.PIPE,
+            universal_newlines=True,
+        )
+        if process.returncode != 0:
+            stderr = process.stderr.strip().splitlines()[-5:]
+            return None, "\n".join(stderr) or f"exit code {process.returncode}"
+        with open(output, "rb") as fd:
+            return pickle.load(fd), None
+    finally:
+        os.unlink(output)
+
+
+def collect_sharded(test_files, jobs=0):
+    """
+    Collect test files in jobs parallel python processes (0 or None means
+    number of CPUs), every shard of files is collected in separate process.
+    Returns list of CollectedItem in the same order as collect()
+    """
+    jobs = min(jobs or os.cpu_count() or 1, len(test_files)) or 1
+    # contiguous shards, files of the same directory share conftest files
+    size, rest = divmod(len(test_files), jobs)
+    shards = list()
+    start = 0
+    for index in range(jobs):
+        end = start + size + (1 if index < rest else 0)
+        shards.append(list(test_files[start:end]))
+        start = end
+    output = list()
+    errors = list()
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        for shard, (items, error) in zip(shards, executor.map(_collect_shard, shards)):
+            if error is not None:
+                errors.append(f"{' '.join(shard)}: {error}")
+                continue
+            output += items
+    if errors:
+        raise FMFError("Collection failed:\n" + "\n".join(errors))
+    return output
+
+
+def _owner_index(item, paths):
+    item_path = cached_realpath(str(item.fspath))
+    for index, path in paths:
+        if item_path == path or item_path.startswith(path + os.sep):
+            return index
+    return paths[-1][0]
+
+
+def pytest_fmf_output(
+    test_files, config, cache=None, jobs=1, isolated=False, compact=False
+):
+    """
+    Collect tests via pytest and return their FMF data (StoreUpdater),
+    with cache (fmf_metadata.cache.MetadataCache) only changed files are collected.
+    jobs other than 1 collect files in parallel processes (see collect_sharded),
+    isolated collects in new process even for one job (long running process,
+    test modules once imported by pytest would not be imported again).
+    compact moves attributes shared by all tests of new nodes (file, class)
+    to them, nodes compacted before are compacted again (see updated_fmf_files)
+    """
+    config = resolve_config(config)
+    results = [None] * len(test_files)
+    cache_keys = [None] * len(test_files)
+    pending = list()
+    for index, filename in enumerate(test_files):
+        # directories could contain any tests, cache just files
+        if cache is not None and os.path.isfile(filename):
+            tree = get_cached_tree(os.path.dirname(os.path.abspath(filename)))
+            cache_keys[index] = cache.key(filename, config, tree_layout(tree))
+            cached = cache.get(cache_keys[index])
+            if cached is not None:
+                nodes = tree_nodes(tree)
+                results[index] = StoreUpdater()
+                for name, data in cached.items():
+                    results[index].add(nodes[name], data)
+                continue
+        results[index] = StoreUpdater()
+        pending.append(index)
+
+    collected = set(pending)
+    if pending:
+        paths = [(index, os.path.realpath(test_files[index])) for index in pending]
+        pending_files = [test_files[index] for index in pending]
+        if jobs == 1 and not isolated:
+            items = collect(pending_files)
+        else:
+            items = collect_sharded(pending_files, jobs)
+        for item in items:
+            debug_print(f"Processing Item: {item}")
+            # merged per file right away, data of items are not kept
+            results[_owner_index(item, paths)].add(
+                *_update_fmf_file(item, config=config)
+            )
+
+    out = StoreUpdater()
+    for index, file_results in enumerate(results):
+        # store to cache before merging, it updates stored dictionaries
+        if cache_keys[index] is not None and index in collected:
+            cache.set(
+                cache_keys[index],
+                {name: data for name, (_, data) in file_results.items()},
+            )
+        for node, out_dict in file_results.values():
+            out.add(node, out_dict)
+    if cache is not None:
+        cache.evict()
+    if compact:
+        # data are compacted together with existing FMF data, when they are stored
+        out.compaction = Compaction(config)
+    return out
+
+
+if __name__ == "__main__":
+    # worker of collect_sharded, items has to be pickled from module
+    # imported via its name, not from __main__
+    from fmf_metadata.pytest_collector import collect_to_file as _collect_to_file
+
+    _collect_to_file(sys.argv[1], sys.argv[2:])
@@ -1,8 +1,7 @@
 import os
 import pytest
 
-from fmf_metadata.base import update_fmf_file, StoreUpdater, store_to_fmf_files
-from fmf_metadata import constants
+from fmf_metadata import constants, pytest_plugin
 
 
 @pytest.fixture(scope="session", autouse=True)
@@ -12,6 +11,15 @@ def store_fmf_metadata(request):
     https://github.com/jscotka/fmf_metadata/
     """
     if os.getenv(constants.ENV_REGENERATE_FMF):
+        config = request.config
+        if hasattr(config, "workerinput") and config.pluginmanager.is_registered(
+            pytest_plugin
+        ):
+            # xdist worker, data are written once by controller (pytest_plugin)
+            return
+        # generator is imported just when metadata are generated
+        from fmf_metadata.base import update_fmf_file, StoreUpdater, store_to_fmf_files
+
         out = StoreUpdater()
         update_fmf_file(
             request.node, config=constants.PYTEST_DEFAULT_CONF, write_dict=out
@@ -0,0 +1,140 @@
+# pytest plugin (registered via pytest11 entry point), generates FMF metadata
+# from items collected by the pytest run itself, without second collection.
+# fmf_metadata modules are imported just in case an option is used.
+#
+# With pytest-xdist every worker processes its part of collected items
+# and sends the data to controller (workeroutput), controller merges them
+# and writes FMF files once at the end of session
+import os
+
+import pytest
+
+WORKER_OUTPUT_KEY = "fmf_metadata"
+
+
+def pytest_addoption(parser):
+    group = parser.getgroup("fmf", "FMF metadata")
+    group.addoption(
+        "--fmf-generate",
+        action="store_true",
+        dest="fmf_generate",
+        help="Print FMF metadata of collected tests",
+    )
+    group.addoption(
+        "--fmf-update",
+        action="store_true",
+        dest="fmf_update",
+        help="Store FMF metadata of collected tests to FMF files",
+    )
+    group.addoption(
+        "--fmf-config",
+        action="store",
+        dest="fmf_config",
+        help="Config file for FMF metadata (CONFIG environment variable has priority)",
+    )
+
+
+def _is_worker(config):
+    return hasattr(config, "workerinput")
+
+
+def _is_xdist_controller(config):
+    return not _is_worker(config) and bool(getattr(config.option, "numprocesses", 0))
+
+
+def _mode(config):
+    """
+    Returns (update, apply markers) or None in case nothing has to be generated,
+    environment variable used by store_fmf_metadata fixture is handled
+    just for xdist, fixture is not able to do it
+    """
+    from fmf_metadata.constants import ENV_REGENERATE_FMF
+
+    options = config.option
+    if options.fmf_generate or options.fmf_update:
+        return options.fmf_update, True
+    if os.getenv(ENV_REGENERATE_FMF) and (
+        _is_worker(config) or _is_xdist_controller(config)
+    ):
+        return True, False
+    return None
+
+
+def _worker_part(items, index, count):
+    """
+    Contiguous part of items processed by worker, items of one function
+    (parametrized) are never split, some attributes (e.g. summary) are stored
+    on the function by its first item
+    """
+    groups = list()
+    for item in items:
+        if groups and groups[-1][0].function is item.function:
+            groups[-1].append(item)
+        else:
+            groups.append([item])
+    start = len(groups) * index // count
+    end = len(groups) * (index + 1) // count
+    return [item for group in groups[start:end] for item in group]
+
+
+class _Aggregator:
+    """ Collects data from xdist workers, writes them at the end of session """
+
+    def __init__(self, update):
+        self.update = update
+        self.outputs = dict()
+
+    @pytest.hookimpl(optionalhook=True)
+    def pytest_testnodedown(self, node, error):
+        output = getattr(node, "workeroutput", {}).get(WORKER_OUTPUT_KEY)
+        if output is not None:
+            self.outputs[node.workerinput["workerid"]] = output
+
+    def pytest_sessionfinish(self, session):
+        from fmf_metadata.base import StoreUpdater, store_to_fmf_files
+
+        out = StoreUpdater()
+        # order of workers, the same data as without xdist
+        for workerid in sorted(self.outputs, key=lambda item: int(item[2:])):
+            out.update_serialized(self.outputs[workerid])
+        store_to_fmf_files(out, update=self.update)
+
+
+def pytest_configure(config):
+    mode = _mode(config)
+    if mode is not None and _is_xdist_controller(config):
+        config.pluginmanager.register(_Aggregator(mode[0]), "fmf_metadata_aggregator")
+
+
+def pytest_collection_finish(session):
+    mode = _mode(session.config)
+    if mode is None:
+        return
+    update, markers = mode
+    from types import SimpleNamespace
+    from fmf_metadata.base import StoreUpdater, store_to_fmf_files, update_fmf_file
+    from fmf_metadata.constants import PYTEST_DEFAULT_CONF
+    from fmf_metadata.pytest_collector import apply_markers
+
+    # just test functions, not e.g. doctests
+    items = [item for item in session.items if hasattr(item, "function")]
+    if markers:
+        # functions are shared by parametrized items, apply all markers
+        apply_markers(items)
+    worker = _is_worker(session.config)
+    if worker:
+        # all workers collect the same items, every one processes its part
+        workerinput = session.config.workerinput
+        items = _worker_part(
+            items, int(workerinput["workerid"][2:]), workerinput["workercount"]
+        )
+    out = StoreUpdater()
+    update_fmf_file(
+        SimpleNamespace(items=items),
+        config=session.config.option.fmf_config or PYTEST_DEFAULT_CONF,
+        write_dict=out,
+    )
+    if worker:
+        session.config.workeroutput[WORKER_OUTPUT_KEY] = out.serialize()
+    else:
+        store_to_fmf_files(out, update=update)
@@ -0,0 +1,265 @@
+import ast
+import copy
+import importlib
+import sys
+import types
+import unittest
+from typing import List
+
+from fmf_metadata.base import (
+    FMFError,
+    _TestCls,
+    debug_print,
+    filepath_tests,
+    module_tests,
+)
+
+# discovery of tests without executing module code, just parsing it via ast
+# decorators from fmf_metadata are evaluated on placeholder functions,
+# anything what could not be evaluated statically (or any statement
+# not modeled here) leads to standard import
+
+FMF_MODULE = "fmf_metadata"
+# decorators from these modules do not touch FMF metadata, ignore them
+NEUTRAL_MODULES = ("unittest", "pytest", "functools")
+NEUTRAL_BUILTINS = ("staticmethod", "classmethod")
+SAFE_BUILTINS = {
+    item.__name__: item
+    for item in (dict, list, tuple, set, frozenset, str, int, float, bool, object)
+}
+ARGS_TEMPLATE = ast.parse("def _(*args, **kwargs): pass").body[0].args
+MAIN_GUARDS = {
+    ast.dump(ast.parse(source, mode="eval").body)
+    for source in ('__name__ == "__main__"', '"__main__" == __name__')
+}
+# modules of standard library (python 3.10+), they do not export test classes
+STDLIB_MODULES = getattr(sys, "stdlib_module_names", frozenset())
+
+
+class StaticFallback(Exception):
+    """ Source construction not possible to evaluate without import """
+
+
+class _Foreign:
+    """ Name imported from module what is not loaded by static discovery """
+
+    def __init__(self, module):
+        self.module = module
+
+
+def _root_name(node):
+    while isinstance(node, (ast.Call, ast.Attribute, ast.Subscript)):
+        node = node.func if isinstance(node, ast.Call) else node.value
+    return node.id if isinstance(node, ast.Name) else None
+
+
+def _is_docstring(item, parent):
+    return item is parent.body[0] and ast.get_docstring(parent, clean=False) is not None
+
+
+def _is_main_guard(node):
+    """if __name__ == "__main__": block, it is not executed by import"""
+    return (
+        isinstance(node, ast.If)
+        and not node.orelse
+        and ast.dump(node.test) in MAIN_GUARDS
+    )
+
+
+def _is_class_name(name):
+    """ Name what could be a class (CapWords), e.g. imported test class """
+    return name[:1].isupper() and not name.isupper()
+
+
+def _module_root(value):
+    if isinstance(value, _Foreign):
+        return value.module
+    if isinstance(value, types.ModuleType):
+        return value.__name__.split(".")[0]
+    return (getattr(value, "__module__", None) or "").split(".")[0]
+
+
+class _Namespace:
+    def __init__(self, filename):
+        self.filename = filename
+        self.names = dict()
+
+    def add_import(self, node):
+        for alias in node.names:
+            root = alias.name.split(".")[0]
+            bound = alias.asname or root
+            if root in (FMF_MODULE, "unittest"):
+                module = importlib.import_module(alias.name)
+                self.names[bound] = module if alias.asname else sys.modules[root]
+            else:
+                self.names[bound] = _Foreign(root)
+
+    def add_import_from(self, node):
+        root = (node.module or "").split(".")[0]
+        for alias in node.names:
+            bound = alias.asname or alias.name
+            if node.level == 0 and root in (FMF_MODULE, "unittest"):
+                module = importlib.import_module(node.module)
+                try:
+                    self.names[bound] = getattr(module, alias.name)
+                except AttributeError:
+                    raise StaticFallback(f"unknown import {alias.name}")
+            else:
+                # loader finds test classes imported to module as well
+                if alias.name == "*" or (
+                    _is_class_name(alias.name)
+                    and not (node.level == 0 and root in STDLIB_MODULES)
+                ):
+                    raise StaticFallback(f"import of {alias.name} from {node.module}")
+                self.names[bound] = _Foreign(root if node.level == 0 else None)
+
+    def add_assign(self, node):
+        targets = node.targets if isinstance(node, ast.Assign) else [node.target]
+        for target in targets:
+            if not isinstance(target, ast.Name):
+                raise StaticFallback(f"assignment to {ast.dump(target)}")
+        if node.value is None:
+            return
+        try:
+            value = ast.literal_eval(node.value)
+        except (ValueError, TypeError, SyntaxError):
+            # e.g. TestA = FMF.tier("1")(TestA) or alias of class
+            for item in targets + list(ast.walk(node.value)):
+                if isinstance(item, ast.Name) and isinstance(
+                    self.names.get(item.id), type
+                ):
+                    raise StaticFallback(f"assignment with class {item.id}")
+            # unknown value, do not allow to use it for evaluation
+            for target in targets:
+                self.names.pop(target.id, None)
+            return
+        for target in targets:
+            self.names[target.id] = value
+
+    def evaluate(self, node):
+        for item in ast.walk(node):
+            if not isinstance(item, ast.Name):
+                continue
+            if item.id in self.names:
+                if not isinstance(self.names[item.id], _Foreign):
+                    continue
+            elif item.id in SAFE_BUILTINS:
+                continue
+            raise StaticFallback(f"unknown name {item.id}")
+        expression = ast.Expression(node)
+        code = compile(expression, self.filename, "eval")
+        context = dict(self.names, __builtins__=SAFE_BUILTINS)
+        try:
+            return eval(code, context)
+        except FMFError:
+            raise
+        except Exception as exc:
+            raise StaticFallback(f"evaluation failed: {exc}")
+
+    def apply_decorators(self, entity, decorator_list):
+        # decorators are applied from the nearest one to the definition
+        for decorator in reversed(decorator_list):
+            root = _root_name(decorator)
+            if root in NEUTRAL_BUILTINS and root not in self.names:
+                continue
+            module = _module_root(self.names.get(root))
+            if module == FMF_MODULE:
+                entity = self.evaluate(decorator)(entity)
+            elif module not in NEUTRAL_MODULES:
+                raise StaticFallback(f"unknown decorator {root}")
+        return entity
+
+
+def _placeholder_function(node, filename):
+    """
+    Create empty function with the same name and docstring,
+    compiled from source, so docstring is the same as imported one
+    """
+    placeholder = copy.copy(node)
+    placeholder.decorator_list = []
+    placeholder.returns = None
+    placeholder.args = ARGS_TEMPLATE
+    placeholder.body = [ast.Pass()]
+    if ast.get_docstring(node, clean=False) is not None:
+        placeholder.body.insert(0, node.body[0])
+    module = ast.Module(body=[placeholder], type_ignores=[])
+    context = dict()
+    exec(compile(ast.fix_missing_locations(module), filename, "exec"), context)
+    return context[node.name]
+
+
+def _placeholder_class(node, namespace):
+    bases = list()
+    for base in node.bases:
+        value = namespace.evaluate(base)
+        if not isinstance(value, type):
+            raise StaticFallback(f"unknown base class {ast.dump(base)}")
+        bases.append(value)
+    if node.keywords:
+        raise StaticFallback(f"class {node.name} uses keywords (metaclass)")
+    content = dict(__module__="non_important")
+    for item in node.body:
+        if isinstance(item, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            function = _placeholder_function(item, namespace.filename)
+            content[item.name] = namespace.apply_decorators(
+                function, item.decorator_list
+            )
+        elif isinstance(item, ast.Assign) and all(
+            isinstance(target, ast.Name) for target in item.targets
+        ):
+            # just literal values, e.g. test_alias = test_one is not evaluated
+            try:
+                value = ast.literal_eval(item.value)
+            except (ValueError, TypeError, SyntaxError):
+                raise StaticFallback(f"class {node.name} assigns unknown value")
+            for target in item.targets:
+                content[target.id] = value
+        elif not (isinstance(item, ast.Pass) or _is_docstring(item, node)):
+            raise StaticFallback(
+                f"class {node.name} contains {type(item).__name__} statement"
+            )
+    test_class = type(node.name, tuple(bases) or (object,), content)
+    return namespace.apply_decorators(test_class, node.decorator_list)
+
+
+def filepath_tests_static(filename) -> List[_TestCls]:
+    """
+    Discover tests of file without importing it.
+    Falls back to filepath_tests in case some part is not possible to evaluate
+    """
+    try:
+        with open(filename) as fd:
+            tree = ast.parse(fd.read(), filename)
+    except SyntaxError:
+        # let import raise the right exception
+        return filepath_tests(filename)
+    namespace = _Namespace(filename)
+    module = types.ModuleType("non_important")
+    try:
+        for node in tree.body:
+            if isinstance(node, ast.Import):
+                namespace.add_import(node)
+            elif isinstance(node, ast.ImportFrom):
+                namespace.add_import_from(node)
+            elif isinstance(node, (ast.Assign, ast.AnnAssign)):
+                namespace.add_assign(node)
+            elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                if node.name == "load_tests":
+                    raise StaticFallback("module uses load_tests protocol")
+                namespace.names.pop(node.name, None)
+            elif isinstance(node, ast.ClassDef):
+                test_class = _placeholder_class(node, namespace)
+                namespace.names[node.name] = test_class
+                if issubclass(test_class, unittest.TestCase):
+                    setattr(module, node.name, test_class)
+            elif not (
+                isinstance(node, ast.Pass)
+                or _is_docstring(node, tree)
+                or _is_main_guard(node)
+            ):
+                # e.g. if/try/for/with blocks, calls (re-decorated classes)
+                raise StaticFallback(f"{type(node).__name__} statement")
+    except StaticFallback as exc:
+        debug_print(f"Static discovery not possible for {filename} ({exc}), import it")
+        return filepath_tests(filename)
+    return module_tests(module, filename)
@@ -0,0 +1,121 @@
+import functools
+import json
+import sys
+import threading
+import time
+
+# functions measured as phases: (module, function name, phase name)
+# functions are replaced by measuring wrappers only when Timings are started,
+# so there is no overhead in case timings are not requested
+PHASES = (
+    ("fmf_metadata.base", "get_test_files", "get_test_files"),
+    ("fmf_metadata.base", "filepath_tests", "filepath_tests"),
+    ("fmf_metadata.static_collector", "filepath_tests_static", "static_discovery"),
+    ("fmf_metadata.base", "file_fmf_dict", "file_fmf_dict"),
+    ("fmf_metadata.base", "test_data_dict", "test_data_dict"),
+    ("fmf_metadata.base", "__post_processing", "post_processing"),
+    ("fmf_metadata.base", "fmf_root_tree", "fmf_tree"),
+    ("fmf_metadata.base", "dict_to_yaml", "dict_to_yaml"),
+    ("fmf_metadata.base", "__dump_yaml", "yaml_dump"),
+    ("fmf_metadata.base", "write_fmf_file", "write_fmf_file"),
+    ("fmf_metadata.base", "_update_fmf_file", "update_fmf_item"),
+    ("fmf_metadata.pytest_collector", "collect", "pytest_collect"),
+)
+# functions what process one test file, first argument identifies the file
+FILE_PHASES = {
+    "file_fmf_dict": lambda args: args[0],
+    "update_fmf_item": lambda args: str(args[0].fspath),
+}
+SLOWEST_FILES = 10
+
+
+class Timings:
+    """
+    Wall time, CPU time and number of calls of phases of FMF generation,
+    and wall time spent by every test file. Work done in other processes
+    (--jobs) is counted just as waiting in main process
+    """
+
+    def __init__(self):
+        self.phases = dict()
+        self.files = dict()
+        self._replaced = list()
+        self._start = None
+        # FMF files are written in threads
+        self._lock = threading.Lock()
+
+    def record(self, phase, wall, cpu, filename=None):
+        with self._lock:
+            item = self.phases.setdefault(phase, [0.0, 0.0, 0])
+            item[0] += wall
+            item[1] += cpu
+            item[2] += 1
+            if filename is not None:
+                self.files[filename] = self.files.get(filename, 0.0) + wall
+
+    def _wrapper(self, function, phase):
+        file_arg = FILE_PHASES.get(phase)
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            wall = time.perf_counter()
+            cpu = time.process_time()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                self.record(
+                    phase,
+                    time.perf_counter() - wall,
+                    time.process_time() - cpu,
+                    filename=file_arg(args) if file_arg else None,
+                )
+
+        return wrapper
+
+    def start(self):
+        """ Replace measured functions by wrappers in all loaded modules """
+        import fmf_metadata.base  # noqa: F401
+        import fmf_metadata.static_collector  # noqa: F401
+
+        for module_name, name, phase in PHASES:
+            module = sys.modules.get(module_name)
+            function = getattr(module, name, None)
+            if function is None:
+                continue
+            wrapper = self._wrapper(function, phase)
+            # functions imported by name to other modules are replaced as well
+            for other in list(sys.modules.values()):
+                # __main__ in case of python -m fmf_metadata.cli
+                spec_name = getattr(getattr(other, "__spec__", None), "name", "")
+                if not (spec_name or "").startswith("fmf_metadata"):
+                    continue
+                for attr, value in list(vars(other).items()):
+                    if value is function:
+                        setattr(other, attr, wrapper)
+                        self._replaced.append((other, attr, function))
+        self._start = (time.perf_counter(), time.process_time())
+
+    def stop(self):
+        """ Return original functions back """
+        for module, attr, function in reversed(self._replaced):
+            setattr(module, attr, function)
+        self._replaced = list()
+        if self._start:
+            wall, cpu = self._start
+            self.record("total", time.perf_counter() - wall, time.process_time() - cpu)
+            self._start = None
+
+    def report(self, slowest=SLOWEST_FILES):
+        """ Report as dictionary, phases are sorted by wall time """
+        phases = sorted(self.phases.items(), key=lambda item: -item[1][0])
+        files = sorted(self.files.items(), key=lambda item: -item[1])[:slowest]
+        return dict(
+            phases={
+                phase: dict(wall=wall, cpu=cpu, calls=calls)
+                for phase, (wall, cpu, calls) in phases
+            },
+            slowest_files=[dict(file=name, wall=wall) for name, wall in files],
+        )
+
+    def to_json(self, slowest=SLOWEST_FILES):
+        return json.dumps(self.report(slowest), indent=4)
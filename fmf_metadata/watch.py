@@ -0,0 +1,134 @@
+import os
+import time
+
+from fmf_metadata.base import debug_print
+from fmf_metadata.constants import WATCH_DEBOUNCE, WATCH_INTERVAL
+
+# watch mode, changes are found by comparing modification times of watched
+# files and their directories, inotify (when available) just wakes the loop up
+try:
+    import inotify_simple
+except ImportError:  # pragma: no cover
+    inotify_simple = None
+
+
+def snapshot(paths):
+    """ Modification time and size of existing paths and their directories """
+    output = dict()
+    for path in set(paths) | {os.path.dirname(path) for path in paths}:
+        try:
+            stat = os.stat(path)
+        except OSError:
+            continue
+        output[path] = (stat.st_mtime_ns, stat.st_size)
+    return output
+
+
+def changed_paths(old, new):
+    """ Paths changed, created or removed between snapshots """
+    return sorted(
+        path for path in old.keys() | new.keys() if old.get(path) != new.get(path)
+    )
+
+
+class PollingWaiter:
+    """ Wakes up periodically """
+
+    def __init__(self, interval=WATCH_INTERVAL):
+        self.interval = interval
+
+    def watch(self, directories):
+        pass
+
+    def wait(self):
+        time.sleep(self.interval)
+
+    def close(self):
+        pass
+
+
+class InotifyWaiter:
+    """ Wakes up when inotify reports change in some of watched directories """
+
+    def __init__(self):
+        self.inotify = inotify_simple.INotify()
+        self.watches = dict()
+        flags = inotify_simple.flags
+        self.mask = (
+            flags.CLOSE_WRITE
+            | flags.CREATE
+            | flags.DELETE
+            | flags.MODIFY
+            | flags.MOVED_FROM
+            | flags.MOVED_TO
+        )
+
+    def watch(self, directories):
+        directories = set(directories)
+        for directory in set(self.watches) - directories:
+            try:
+                self.inotify.rm_watch(self.watches.pop(directory))
+            except OSError:
+                # directory was removed, watch is removed as well
+                pass
+        for directory in directories - set(self.watches):
+            try:
+                self.watches[directory] = self.inotify.add_watch(directory, self.mask)
+            except OSError as exc:
+                debug_print(f"Unable to watch {directory}: {exc}")
+
+    def wait(self):
+        self.inotify.read()
+
+    def close(self):
+        self.inotify.close()
+
+
+def default_waiter(interval=WATCH_INTERVAL):
+    if inotify_simple is not None:
+        return InotifyWaiter()
+    debug_print(f"inotify_simple is not installed, checking files every {interval}s")
+    return PollingWaiter(interval)
+
+
+def watch(paths, update, waiter=None, debounce=WATCH_DEBOUNCE, iterations=None):
+    """
+    Call update(changed paths) whenever some of watched files changes.
+    paths() returns files to watch, it is called again after every update
+    (files written by update do not cause another update). Changes within
+    debounce seconds are handled by one update, failed update is reported
+    and watching continues. iterations limits number of updates
+    """
+    waiter = waiter or default_waiter()
+    try:
+        watched = paths()
+        state = snapshot(watched)
+        while iterations is None or iterations > 0:
+            waiter.watch({os.path.dirname(path) for path in watched})
+            waiter.wait()
+            current = snapshot(watched)
+            if current == state:
+                continue
+            # wait until files are stable (e.g. editor writes file in steps)
+            while True:
+                time.sleep(debounce)
+                latest = snapshot(watched)
+                if latest == current:
+                    break
+                current = latest
+            changed = changed_paths(state, current)
+            start = time.perf_counter()
+            try:
+                update(changed)
+            except Exception as exc:
+                debug_print(f"Update failed: {exc}")
+            debug_print(
+                f"Update of {len(changed)} changed paths took "
+                f"{time.perf_counter() - start:.3f}s"
+            )
+            watched = paths()
+            state = snapshot(watched)
+            if iterations is not None:
+                iterations -= 1
+    finally:
+        waiter.close()
@@ -0,0 +1,29 @@
+import os
+import shutil
+import tempfile
+from pathlib import Path
+
+CURRENT_DIR = Path(__file__).parent.absolute()
+
+
+def temp_tree(testcase, files=None, fmf_root=False):
+    """
+    Temporary directory removed after the test, files maps relative paths
+    to content (str) or to Path of file or directory to copy there,
+    fmf_root makes it root of FMF tree
+    """
+    tempdir = tempfile.mkdtemp()
+    testcase.addCleanup(shutil.rmtree, tempdir)
+    if fmf_root:
+        files = dict({".fmf/version": "1\n"}, **(files or {}))
+    for name, content in (files or {}).items():
+        path = os.path.join(tempdir, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if isinstance(content, Path) and content.is_dir():
+            shutil.copytree(content, path, dirs_exist_ok=True)
+        elif isinstance(content, Path):
+            shutil.copy(content, path)
+        else:
+            with open(path, "w") as fd:
+                fd.write(content)
+    return tempdir
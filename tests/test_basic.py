@@ -1,8 +1,36 @@
+import os
+import pickle
+import subprocess
+import sys
 import unittest
-from pathlib import Path
-from fmf_metadata.base import yaml_fmf_output, FMFError, read_config
+from types import SimpleNamespace
+from unittest.mock import patch
 
-CURRENT_DIR = Path(__file__).parent.absolute()
+import fmf
+
+from fmf_metadata import base
+from fmf_metadata import FMF
+from fmf_metadata.base import (
+    yaml_fmf_output,
+    FMFError,
+    read_config,
+    dict_to_yaml,
+    fmf_registry,
+    StoreUpdater,
+    store_to_fmf_files,
+    FMFConfig,
+    check_config,
+    resolve_config,
+    fmf_output_items,
+    yaml_chunks,
+    node_differences,
+    stale_fmf_nodes,
+    get_cached_tree,
+    deepest_node,
+)
+from fmf_metadata.decorators import fmf_class_metadata, fmf_merged_registry
+from fmf_metadata.timings import Timings
+from tests.helpers import CURRENT_DIR, temp_tree
 
 
 class TestFMF(unittest.TestCase):
@@ -48,6 +76,106 @@ class TestFMF(unittest.TestCase):
             {"a": "c", "b": "d", "x": "y"},
         )
 
+    def testRegistry(self):
+        @FMF.tier("tier1")
+        @FMF.tag("a", post_mark="+")
+        def test():
+            pass
+
+        self.assertEqual(
+            fmf_registry(test),
+            {"_fmf__tag": ("+", ["a"]), "_fmf__tier": ("", "tier1")},
+        )
+        # attributes are readable as before
+        self.assertEqual(getattr(test, "_fmf__tag+"), ["a"])
+        self.assertEqual(test._fmf__tier, "tier1")
+
+    def testFunctionData(self):
+        @FMF.tier("1")
+        def test():
+            pass
+
+        def data(name):
+            test_dict = {"tier+": "0", "other": 1}
+            base.test_data_dict(
+                test_dict,
+                {},
+                "test.py",
+                base._TestCls(None, "test.py"),
+                SimpleNamespace(name=name, method=test),
+            )
+            return test_dict
+
+        self.assertEqual(
+            data("test[a]"), {"other": 1, "summary": "test.py test[a]", "tier": "1"}
+        )
+        # computed once per function, decorators update it
+        self.assertEqual(data("test[b]")["summary"], "test.py test[a]")
+        FMF.tag("a")(test)
+        self.assertEqual(data("test[c]")["tag"], ["a"])
+
+    def testClassDecorators(self):
+        @FMF.tag("base")
+        class Base(unittest.TestCase):
+            @FMF.tag("method")
+            @FMF.tier("1")
+            @FMF.environment(A="method")
+            def test_one(self):
+                pass
+
+        @FMF.tag("child2")
+        @FMF.tag("child1")
+        @FMF.tier("2")
+        @FMF.environment(A="child", B="child")
+        @FMF.adjust("distro > 1")
+        class Child(Base):
+            pass
+
+        def data(test_class):
+            test_dict = dict()
+            base.test_data_dict(
+                test_dict,
+                {},
+                "test.py",
+                base._TestCls(test_class, "test.py"),
+                SimpleNamespace(name="test_one", method=Base.test_one),
+            )
+            return test_dict
+
+        self.assertEqual(
+            data(Child),
+            {
+                "summary": "test.py Child test_one",
+                "tag": ["method", "base", "child1", "child2"],
+                "tier": "1",
+                "adjust": [{"when": "distro > 1", "enabled": False}],
+                "environment": {"A": "method"},
+            },
+        )
+        # class decorators are recorded on the class, functions are not changed
+        self.assertEqual(fmf_registry(Base.test_one)["_fmf__tag"], ("", ["method"]))
+        self.assertEqual(data(Base)["tag"], ["method", "base"])
+        self.assertNotIn("adjust", data(Base))
+        FMF.tag("child3")(Child)
+        self.assertEqual(data(Child)["tag"][-1], "child3")
+
+        @FMF.adjust("distro > 1")
+        class Two(unittest.TestCase):
+            def test_one(self):
+                pass
+
+            def test_two(self):
+                pass
+
+        registries = [
+            fmf_merged_registry(method, fmf_class_metadata(Two, method))
+            for method in (Two.test_one, Two.test_two)
+        ]
+        # every test has own value, shared values are YAML aliases
+        first, second = (registry["_fmf__adjust"][1] for registry in registries)
+        self.assertEqual(first, second)
+        self.assertIsNot(first, second)
+
     def testBadFMFKey(self):
         with self.assertRaises(FMFError) as ctx:
             yaml_fmf_output(path=CURRENT_DIR, testfile_globs=["test-bad-fmf-key"])
@@ -104,3 +232,357 @@ class TestConfig(unittest.TestCase):
         self.assertEqual(
             out["/check-example.py"]["/Test1"]["/testMerge"]["tag+"], ["t2", "t1"]
         )
+
+    def testFrozen(self):
+        config = read_config(CURRENT_DIR / "metadata_config.yaml")
+        self.assertIsInstance(config, FMFConfig)
+        self.assertEqual(config["test_glob"], ("check-ex*",))
+        self.assertEqual(hash(config), hash(FMFConfig(dict(config))))
+        self.assertEqual(pickle.loads(pickle.dumps(config)), config)
+        with self.assertRaises(TypeError):
+            config["test_glob"] = []
+        with self.assertRaises(AttributeError):
+            config._data = {}
+
+    def testResolveOnce(self):
+        config_file = str(CURRENT_DIR / "metadata_config.yaml")
+        with patch.dict(os.environ, {"CONFIG": config_file}):
+            with patch.object(base, "read_config", wraps=read_config) as read:
+                config = resolve_config({"unused": 1})
+                self.assertIs(check_config(config), config)
+        read.assert_called_once_with(config_file)
+        self.assertNotIn("unused", config)
+        with patch.dict(os.environ, {"CONFIG": ""}):
+            self.assertEqual(resolve_config({}, default={"a": [1]}), {"a": (1,)})
+            self.assertEqual(resolve_config(config_file), config)
+
+    def testPostProcessingCompiledOnce(self):
+        config = read_config(CURRENT_DIR / "metadata_config.yaml")
+        with patch.object(
+            base, "compile_multiline", wraps=base.compile_multiline
+        ) as compile_multiline:
+            yaml_fmf_output(config=config)
+            yaml_fmf_output(config=config)
+        compile_multiline.assert_not_called()
+
+    def testPostProcessingCachedByValue(self):
+        post_processing = {"deep": {"test": "cls.file"}, "random": '"value"'}
+        compiled = base.compiled_post_processing(FMFConfig(post_processing))
+        # equal configs share compiled code, stored configs do not pile up
+        self.assertIs(base.compiled_post_processing(post_processing), compiled)
+        self.assertIs(
+            base.compiled_post_processing(FMFConfig(dict(post_processing))), compiled
+        )
+        self.assertIsNotNone(base._compiled_post_processing.cache_info().maxsize)
+
+    def testPostProcessingSyntaxError(self):
+        with self.assertRaises(FMFError) as ctx:
+            yaml_fmf_output(
+                path=CURRENT_DIR,
+                testfile_globs=["test-basic"],
+                config={"test_postprocessing": {"deep": {"test": "cls.file +"}}},
+            )
+        self.assertIn(
+            "Unable to compile test_postprocessing item deep.test", str(ctx.exception)
+        )
+
+    def testPostProcessingEmpty(self):
+        for value in ["", "# comment"]:
+            with self.assertRaises(FMFError) as ctx:
+                base.compile_post_processing({"deep": {"test": value}})
+            self.assertEqual(
+                str(ctx.exception),
+                f"Unable to compile test_postprocessing item deep.test ({value!r}): "
+                "empty expression",
+            )
+
+    def testPostProcessingStatements(self):
+        out = yaml_fmf_output(
+            path=CURRENT_DIR,
+            testfile_globs=["test-basic"],
+            config={
+                "test_postprocessing": {
+                    "first": "value = test.name\nvalue.upper()",
+                    "second": '"value" in dir()',
+                }
+            },
+        )
+        data = out["/test-basic"]["/Test1"]["/testAdjust"]
+        self.assertEqual(data["first"], "TESTADJUST")
+        self.assertFalse(data["second"])
+
+    def testPostProcessingModules(self):
+        out = yaml_fmf_output(
+            path=CURRENT_DIR,
+            testfile_globs=["test-basic"],
+            config={
+                "test_postprocessing": {
+                    "fmf": "fmf.Tree.__name__",
+                    "inspect": "inspect.isclass(cls.cls)",
+                }
+            },
+        )
+        data = out["/test-basic"]["/Test1"]["/testAdjust"]
+        self.assertEqual(data["fmf"], "Tree")
+        self.assertTrue(data["inspect"])
+
+
+class TestParallel(unittest.TestCase):
+    def testSameAsSerial(self):
+        config = read_config(CURRENT_DIR / "metadata_config.yaml")
+        testfile_globs = ["test-basic", "check-example.py", "test-static-fallback"]
+        serial = yaml_fmf_output(
+            path=CURRENT_DIR, testfile_globs=testfile_globs, config=config
+        )
+        parallel = yaml_fmf_output(
+            path=CURRENT_DIR, testfile_globs=testfile_globs, config=config, jobs=2
+        )
+        self.assertEqual(dict_to_yaml(serial), dict_to_yaml(parallel))
+
+    def testErrorsWithFilename(self):
+        with self.assertRaises(FMFError) as ctx:
+            yaml_fmf_output(
+                path=CURRENT_DIR,
+                testfile_globs=[
+                    "test-basic",
+                    "test-raise-bad-value",
+                    "test-raise-merging",
+                ],
+                jobs=2,
+            )
+        self.assertIn(
+            str(CURRENT_DIR / "test-raise-bad-value") + ": type <class 'int'>",
+            str(ctx.exception),
+        )
+        self.assertIn(
+            str(CURRENT_DIR / "test-raise-merging") + ": you are mixing",
+            str(ctx.exception),
+        )
+
+
+class TestStream(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = temp_tree(
+            self, {"main.fmf": "/first: 1\n/test-basic:\n    tier: '2'\nlast: 2\n"}
+        )
+        self.fmf_file = os.path.join(self.tempdir, "main.fmf")
+
+    def generator_args(self):
+        return dict(
+            path=CURRENT_DIR,
+            testfile_globs=["test-static-fallback", "test-basic"],
+            fmf_file=self.fmf_file,
+        )
+
+    def testSameAsWhole(self):
+        data = yaml_fmf_output(**self.generator_args())
+        self.assertEqual(
+            list(data),
+            ["/first", "/test-basic", "last", "/test-static-fallback"],
+        )
+        chunks = list(yaml_chunks(fmf_output_items(**self.generator_args())))
+        self.assertEqual(len(chunks), 4)
+        self.assertEqual("".join(chunks), dict_to_yaml(data))
+        self.assertEqual(list(yaml_chunks([])), [dict_to_yaml({})])
+
+    def testIncremental(self):
+        items = fmf_output_items(**self.generator_args())
+        with patch.object(
+            base, "file_fmf_dict", wraps=base.file_fmf_dict
+        ) as file_fmf_dict:
+            self.assertEqual(next(items)[0], "/first")
+            file_fmf_dict.assert_not_called()
+            self.assertEqual(next(items)[0], "/test-basic")
+            self.assertEqual(file_fmf_dict.call_count, 2)
+            self.assertEqual(next(items)[0], "last")
+            self.assertEqual(next(items)[0], "/test-static-fallback")
+            self.assertEqual(file_fmf_dict.call_count, 2)
+
+
+class TestTimings(unittest.TestCase):
+    def testReport(self):
+        original = base.test_data_dict
+        timings = Timings()
+        timings.start()
+        try:
+            self.assertIsNot(base.test_data_dict, original)
+            base.dict_to_yaml(
+                base.yaml_fmf_output(path=CURRENT_DIR, testfile_globs=["test-basic"])
+            )
+        finally:
+            timings.stop()
+        self.assertIs(base.test_data_dict, original)
+        report = timings.report()
+        self.assertEqual(report["phases"]["file_fmf_dict"]["calls"], 1)
+        self.assertGreater(report["phases"]["test_data_dict"]["calls"], 1)
+        self.assertIn("dict_to_yaml", report["phases"])
+        self.assertEqual(list(report["phases"])[0], "total")
+        self.assertEqual(
+            [item["file"] for item in report["slowest_files"]],
+            [str(CURRENT_DIR / "test-basic")],
+        )
+
+
+class TestYaml(unittest.TestCase):
+    DATA = {
+        "summary": "short",
+        "description": "first line\n  indented\nlast ",
+        "tag": ["Tier1", "ünicode", "x" * 120, "a b " * 40],
+        "": {"/nested": {"key": "value", "multi\nline": 1}},
+        "emoji": "\U0001f600",
+        "empty": [],
+    }
+
+    def python_yaml(self, data):
+        with patch.object(base, "CYamlDumper", None):
+            return dict_to_yaml(data)
+
+    def testSameAsPython(self):
+        out = yaml_fmf_output(
+            path=CURRENT_DIR, testfile_globs=["test-basic", "test-static-fallback"]
+        )
+        for data in (out, self.DATA, [self.DATA], {}):
+            self.assertEqual(dict_to_yaml(data), self.python_yaml(data))
+
+    def testNoAliases(self):
+        item = {"a": 1}
+        self.assertNotIn("&", dict_to_yaml({"x": item, "y": item}))
+
+    def testLoad(self):
+        self.assertEqual(
+            base.yaml.load(dict_to_yaml(self.DATA), Loader=base.YamlLoader), self.DATA
+        )
+
+
+class TestStore(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = temp_tree(
+            self,
+            {"main.fmf": "base: a\n/a:\n    tier: '1'\n/b:\n    tier: '1'\n"},
+            fmf_root=True,
+        )
+        self.main_fmf = os.path.join(self.tempdir, "main.fmf")
+
+    def stored_items(self, tier):
+        tree = fmf.Tree(self.tempdir)
+        out = StoreUpdater()
+        for name in ["/a", "/b"]:
+            out[tree.find(name)] = {"tier": tier}
+        return out
+
+    def testSingleWrite(self):
+        with patch.object(base.os, "replace", wraps=os.replace) as replace:
+            store_to_fmf_files(self.stored_items("2"), update=True)
+        replace.assert_called_once()
+        tree = fmf.Tree(self.tempdir)
+        self.assertEqual(tree.find("/a").get("tier"), "2")
+        self.assertEqual(tree.find("/b").get("tier"), "2")
+        self.assertEqual(tree.find("/a").get("base"), "a")
+
+    def testNotChanged(self):
+        with patch.object(base.os, "replace", wraps=os.replace) as replace:
+            store_to_fmf_files(self.stored_items("1"), update=True)
+        replace.assert_not_called()
+
+    def testParallelWrite(self):
+        names = ["x", "y", "z"]
+        for name in names:
+            os.makedirs(os.path.join(self.tempdir, name))
+            with open(os.path.join(self.tempdir, name, "main.fmf"), "w") as fd:
+                fd.write("tier: '1'\n")
+        failing = os.path.join(self.tempdir, "y", "main.fmf")
+        write_fmf_file = base.write_fmf_file
+
+        def write(source, data):
+            if source == failing:
+                raise OSError("disk full")
+            return write_fmf_file(source, data)
+
+        tree = fmf.Tree(self.tempdir)
+        out = StoreUpdater()
+        for name in names:
+            out[tree.find(f"/{name}")] = {"tier": "2"}
+        with patch.object(base, "write_fmf_file", side_effect=write):
+            with self.assertRaises(FMFError) as ctx:
+                store_to_fmf_files(out, update=True, jobs=3)
+        self.assertEqual(str(ctx.exception), f"{failing}: OSError: disk full")
+        tree = fmf.Tree(self.tempdir)
+        self.assertEqual(
+            [tree.find(f"/{name}").get("tier") for name in names], ["2", "1", "2"]
+        )
+
+    def testStaleNodes(self):
+        self.assertEqual(stale_fmf_nodes(self.stored_items("1")), [])
+        self.assertEqual(
+            stale_fmf_nodes(self.stored_items("2")),
+            [("/a", "tier", "1", "2"), ("/b", "tier", "1", "2")],
+        )
+
+    def testSharedTree(self):
+        os.makedirs(os.path.join(self.tempdir, "a", "b"))
+        tree = get_cached_tree(self.tempdir)
+        self.assertIs(get_cached_tree(os.path.join(self.tempdir, "a", "b")), tree)
+        self.assertEqual(deepest_node(tree, ["a", "x", "y"]), (tree.find("/a"), 1))
+        self.assertEqual(deepest_node(tree, ["b"]), (tree.find("/b"), 1))
+        self.assertEqual(deepest_node(tree, ["", "a"]), (tree, 0))
+
+    def testNodeDifferences(self):
+        current = {"key": 1, "/a": {"tier": "1", "old": 1}, "/b": {}}
+        expected = {"key": 1, "/a": {"tier": "2"}, "/c": {"tier": "1"}, "/b": {}}
+        self.assertEqual(
+            node_differences(expected, current),
+            [
+                ("/a", "tier", "1", "2"),
+                ("/a", "old", 1, base.MISSING),
+                ("/", "/c", base.MISSING, {"tier": "1"}),
+            ],
+        )
+
+
+class TestImport(unittest.TestCase):
+    # modules what test modules do not need to import FMF decorators
+    HEAVY_MODULES = {"fmf", "yaml", "fmf_metadata.base", "unittest", "ast", "glob"}
+
+    def imported_modules(self, *args):
+        """ Modules imported by python with args, according to -X importtime """
+        process = subprocess.run(
+            [sys.executable, "-X", "importtime"] + list(args),
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.PIPE,
+            universal_newlines=True,
+            check=True,
+        )
+        return {
+            line.split("|")[-1].strip()
+            for line in process.stderr.splitlines()
+            if line.startswith("import time:") and "|" in line
+        }
+
+    def testDecorators(self):
+        modules = self.imported_modules(
+            "-c", "from fmf_metadata import FMF"
+        ) - self.imported_modules("-c", "pass")
+        self.assertIn("fmf_metadata.decorators", modules)
+        self.assertEqual(modules & self.HEAVY_MODULES, set())
+
+    def testGenerator(self):
+        # generator does not depend on modules imported by fmf
+        code = (
+            "from fmf_metadata.base import yaml_fmf_output; "
+            f"yaml_fmf_output(path={str(CURRENT_DIR)!r}, testfile_globs=['test-basic'])"
+        )
+        modules = self.imported_modules("-c", code)
+        self.assertNotIn("fmf", modules)
+
+    def testCliHelp(self):
+        modules = self.imported_modules("-m", "fmf_metadata.cli", "--help")
+        self.assertEqual(
+            modules & {"fmf", "yaml", "pytest", "fmf_metadata.base"}, set()
+        )
+
+    def testCliUnittest(self):
+        tempdir = temp_tree(self, {"test-basic": CURRENT_DIR / "test-basic"})
+        args = ("--path", tempdir)
+        modules = self.imported_modules("-m", "fmf_metadata.cli", *args)
+        self.assertIn("fmf_metadata.base", modules)
+        self.assertEqual(modules & {"fmf", "pytest"}, set())
@@ -0,0 +1,114 @@
+import os
+import pickle
+import shutil
+import unittest
+from unittest.mock import patch
+
+from fmf_metadata import base, pytest_collector
+from fmf_metadata.base import yaml_fmf_output, dict_to_yaml
+from fmf_metadata.cache import MetadataCache
+from fmf_metadata.constants import PYTEST_DEFAULT_CONF
+from fmf_metadata.pytest_collector import pytest_fmf_output
+from tests.helpers import CURRENT_DIR, temp_tree
+
+
+class TestCache(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = temp_tree(self, {"test-basic": CURRENT_DIR / "test-basic"})
+        self.cache_dir = os.path.join(self.tempdir, ".fmf", "cache")
+        self.test_file = os.path.join(self.tempdir, "test-basic")
+
+    def output(self, cache):
+        return dict_to_yaml(
+            yaml_fmf_output(
+                path=self.tempdir, testfile_globs=["test-*"], fmf_file="", cache=cache
+            )
+        )
+
+    def testReuse(self):
+        expected = self.output(None)
+        self.assertEqual(self.output(MetadataCache(self.cache_dir)), expected)
+        with patch.object(base, "file_fmf_dict") as file_fmf_dict:
+            self.assertEqual(self.output(MetadataCache(self.cache_dir)), expected)
+        file_fmf_dict.assert_not_called()
+        with patch.object(base, "file_fmf_dict") as file_fmf_dict:
+            self.output(MetadataCache(self.cache_dir, rebuild=True))
+        file_fmf_dict.assert_called_once()
+
+    def testChangedFile(self):
+        self.output(MetadataCache(self.cache_dir))
+        with open(self.test_file, "a") as fd:
+            fd.write("\n\nclass TestNew(unittest.TestCase):\n    def test(self):\n")
+            fd.write("        pass\n")
+        out = self.output(MetadataCache(self.cache_dir))
+        self.assertIn("/TestNew", out)
+
+    def testUpdate(self):
+        main_fmf = os.path.join(self.tempdir, "main.fmf")
+
+        def output(cache):
+            return yaml_fmf_output(
+                path=self.tempdir,
+                testfile_globs=["test-*"],
+                fmf_file=main_fmf,
+                cache=cache,
+            )
+
+        data = output(None)
+        file_data = data["/test-basic"]
+        test_data = next(iter(next(iter(file_data.values())).values()))
+        file_data["component"] = ["comp"]
+        test_data["extra"] = 1
+        test_data["tag+"] = ["hand-written"]
+        with open(main_fmf, "w") as fd:
+            fd.write(dict_to_yaml(data))
+        expected = output(None)
+        self.assertEqual(output(MetadataCache(self.cache_dir)), expected)
+        with open(main_fmf, "w") as fd:
+            fd.write(dict_to_yaml(expected))
+        # updated FMF file is not part of cache key
+        with patch.object(base, "file_fmf_dict") as file_fmf_dict:
+            self.assertEqual(output(MetadataCache(self.cache_dir)), expected)
+        file_fmf_dict.assert_not_called()
+
+    def testEviction(self):
+        self.output(MetadataCache(self.cache_dir))
+        self.assertEqual(len(os.listdir(self.cache_dir)), 1)
+        self.output(MetadataCache(self.cache_dir, max_size=0, rebuild=True))
+        self.assertEqual(os.listdir(self.cache_dir), [])
+
+    def testJSON(self):
+        cache = MetadataCache(self.cache_dir)
+        cache.set("data", {"/a": {"tag": ["x"], "enabled": False, "order": 1}})
+        # tuples would be loaded as lists, such values are not stored
+        cache.set("tuple", {"/a": {"tag": ("x",)}})
+        self.assertEqual(sorted(os.listdir(self.cache_dir)), ["data.json"])
+        self.assertEqual(
+            cache.get("data"), {"/a": {"tag": ["x"], "enabled": False, "order": 1}}
+        )
+        # pickled item is never loaded, it is removed
+        with open(os.path.join(self.cache_dir, "pickled.pickle"), "wb") as fd:
+            fd.write(pickle.dumps({"/a": {}}))
+        with open(os.path.join(self.cache_dir, "broken.json"), "w") as fd:
+            fd.write("{")
+        self.assertIsNone(cache.get("pickled"))
+        self.assertIsNone(cache.get("broken"))
+        cache.evict()
+        self.assertNotIn("pickled.pickle", os.listdir(self.cache_dir))
+
+    def testPytest(self):
+        shutil.copytree(CURRENT_DIR / "pytest", self.tempdir, dirs_exist_ok=True)
+        test_file = os.path.join(self.tempdir, "unit", "test_pytest.py")
+
+        def output(cache):
+            out = pytest_fmf_output(
+                [test_file], config=PYTEST_DEFAULT_CONF, cache=cache, isolated=True
+            )
+            return {name: data for name, (_, data) in out.items()}
+
+        expected = output(None)
+        self.assertEqual(output(MetadataCache(self.cache_dir)), expected)
+        self.assertEqual(len(os.listdir(self.cache_dir)), 1)
+        with patch.object(pytest_collector, "collect_sharded") as collect_sharded:
+            self.assertEqual(output(MetadataCache(self.cache_dir)), expected)
+        collect_sharded.assert_not_called()
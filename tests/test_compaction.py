@@ -0,0 +1,182 @@
+import os
+import shutil
+import unittest
+
+import fmf
+import yaml
+
+from fmf_metadata import base, compaction
+from fmf_metadata.base import (
+    yaml_fmf_output,
+    FMFError,
+    dict_to_yaml,
+    store_to_fmf_files,
+    stale_fmf_nodes,
+    clear_tree_cache,
+)
+from fmf_metadata.constants import PYTEST_DEFAULT_CONF
+from fmf_metadata.pytest_collector import pytest_fmf_output
+from tests.helpers import CURRENT_DIR, temp_tree
+
+
+class TestCompaction(unittest.TestCase):
+    TEST_FILE = """
+import unittest
+from fmf_metadata import FMF
+
+
+@FMF.tier("1")
+@FMF.tag("shared", post_mark="+")
+class TestA(unittest.TestCase):
+    def test_one(self):
+        pass
+
+    @FMF.tag("one", post_mark="+")
+    def test_two(self):
+        pass
+"""
+
+    def setUp(self):
+        self.tempdir = temp_tree(self, {"test_compact.py": self.TEST_FILE})
+        self.test_file = os.path.join(self.tempdir, "test_compact.py")
+        self.main_fmf = os.path.join(self.tempdir, "main.fmf")
+
+    def write(self, content):
+        with open(self.test_file, "w") as fd:
+            fd.write(content)
+
+    def output(self, compact, fmf_file):
+        return yaml_fmf_output(
+            path=self.tempdir,
+            testfile_globs=["test_*.py"],
+            fmf_file=fmf_file,
+            compact=compact,
+        )
+
+    def testCompact(self):
+        keys = compaction.generated_keys({})
+        data = {
+            "/f": {
+                "/a": {"tier": "1", "enabled": True, "tag+": ["x"], "/x": {}},
+                "/b": {"tier": "1", "enabled": 1, "tag+": ["x"], "tag": ["y"]},
+            },
+            # nothing is moved from the only child
+            "/c": {"/only": {"tier": "2"}},
+        }
+        out = compaction.compact_fmf_dict(data, keys)
+        self.assertEqual(
+            out,
+            {
+                "/f": {
+                    "tier": "1",
+                    "/compacted-keys": {"/": {"select": False}, "keys": ["tier"]},
+                    "/a": {"enabled": True, "tag+": ["x"], "/x": {}},
+                    "/b": {"enabled": 1, "tag+": ["x"], "tag": ["y"]},
+                },
+                "/c": {"/only": {"tier": "2"}},
+            },
+        )
+        compaction.check_compaction(data, out)
+        with self.assertRaises(FMFError):
+            compaction.check_compaction(
+                data, dict(out, **{"/f": dict(out["/f"], tier="2")})
+            )
+        # original data are not changed
+        self.assertEqual(data["/f"]["/a"]["tier"], "1")
+        # moved attributes are moved back to the same nodes
+        compaction.expand_compacted(out)
+        self.assertEqual(out, data)
+
+    def testUpdate(self):
+        data = self.output(True, self.main_fmf)
+        cls_data = data["/test_compact.py"]["/TestA"]
+        self.assertEqual(cls_data["tier"], "1")
+        self.assertEqual(
+            cls_data["/test_one"],
+            {"summary": "test_compact.py TestA test_one", "tag+": ["shared"]},
+        )
+        self.assertEqual(cls_data["/test_two"]["tag+"], ["one", "shared"])
+        with open(self.main_fmf, "w") as fd:
+            fd.write(dict_to_yaml(data))
+        # attributes moved to class are not kept, when they are not generated
+        self.write(self.TEST_FILE.replace('@FMF.tier("1")', ""))
+        data = self.output(True, self.main_fmf)
+        self.assertNotIn("tier", data["/test_compact.py"]["/TestA"])
+        self.assertEqual(
+            compaction.resolved_leaves(data),
+            compaction.resolved_leaves(self.output(False, "")),
+        )
+
+    def testHandWritten(self):
+        with open(self.main_fmf, "w") as fd:
+            fd.write("/test_compact.py:\n  tier: '3'\n  component: [comp]\n")
+        expected = compaction.resolved_leaves(self.output(False, self.main_fmf))
+        for _ in range(2):
+            data = self.output(True, self.main_fmf)
+            with open(self.main_fmf, "w") as fd:
+                fd.write(dict_to_yaml(data))
+            file_data = data["/test_compact.py"]
+            self.assertEqual(file_data["tier"], "3")
+            self.assertEqual(file_data["component"], ["comp"])
+            self.assertNotIn("/compacted-keys", file_data)
+            self.assertEqual(file_data["/TestA"]["/compacted-keys"]["keys"], ["tier"])
+            self.assertEqual(compaction.resolved_leaves(data), expected)
+
+    def testNotCompacted(self):
+        expected = self.output(False, self.main_fmf)
+        with open(self.main_fmf, "w") as fd:
+            fd.write(dict_to_yaml(self.output(True, self.main_fmf)))
+        # compacted attributes are moved back to tests, not duplicated
+        self.assertEqual(self.output(False, self.main_fmf), expected)
+
+    def pytest_output(self, compact):
+        clear_tree_cache()
+        return pytest_fmf_output(
+            [os.path.join(self.tempdir, "unit", "test_compact.py")],
+            config=PYTEST_DEFAULT_CONF,
+            isolated=True,
+            compact=compact,
+        )
+
+    def pytest_tree(self):
+        shutil.copytree(CURRENT_DIR / "pytest", self.tempdir, dirs_exist_ok=True)
+        shutil.move(
+            self.test_file, os.path.join(self.tempdir, "unit", "test_compact.py")
+        )
+        return os.path.join(self.tempdir, "unit", "main.fmf")
+
+    def testPytest(self):
+        main_fmf = self.pytest_tree()
+
+        def update(compact):
+            store_to_fmf_files(self.pytest_output(compact), update=True)
+            clear_tree_cache()
+            tree = fmf.Tree(self.tempdir)
+            return {node.name: node.data for node in tree.climb()}
+
+        expected = update(False)
+        shutil.copy(CURRENT_DIR / "pytest" / "unit" / "main.fmf", main_fmf)
+        # nodes compacted before are compacted again, not duplicated
+        for _ in range(2):
+            self.assertEqual(update(True), expected)
+        with open(main_fmf) as fd:
+            cls_data = yaml.safe_load(fd)["/test_compact.py"]["/TestA"]
+        self.assertEqual(cls_data["tier"], "1")
+        self.assertNotIn("tier", cls_data["/test_one"])
+        # tests get all attributes back, when data are not compacted
+        self.assertEqual(update(False), expected)
+        with open(main_fmf) as fd:
+            self.assertNotIn("compacted", fd.read())
+
+    def testPytestCheck(self):
+        self.pytest_tree()
+        store_to_fmf_files(self.pytest_output(True), update=True)
+        # raw data with merging postfixes are compared, not resolved data
+        self.assertEqual(stale_fmf_nodes(self.pytest_output(True)), [])
+        # compacted attributes are moved back to tests without compact
+        self.assertIn(
+            ("/unit/test_compact.py/TestA", "tier", "1", base.MISSING),
+            stale_fmf_nodes(self.pytest_output(False)),
+        )
+        store_to_fmf_files(self.pytest_output(False), update=True)
+        self.assertEqual(stale_fmf_nodes(self.pytest_output(False)), [])
@@ -0,0 +1,175 @@
+import os
+import sys
+import unittest
+from unittest.mock import patch
+
+from fmf_metadata import static_collector
+from fmf_metadata.base import (
+    yaml_fmf_output,
+    FMFError,
+    read_config,
+    dict_to_yaml,
+    get_test_files,
+)
+from fmf_metadata.static_collector import filepath_tests_static
+from tests.helpers import CURRENT_DIR, temp_tree
+
+
+class TestDiscovery(unittest.TestCase):
+    FILES = (
+        "test-a",
+        "sub/test-b",
+        "sub/deep/test-c",
+        "sub/ignored/test-d",
+        "sub/test-e.log",
+        "sub/test-kept.log",
+        "other/test-f",
+        "__pycache__/test-g",
+        "venv/test-h",
+        "env/pyvenv.cfg",
+        "env/test-i",
+    )
+
+    def setUp(self):
+        files = {name: CURRENT_DIR / "test-basic" for name in self.FILES}
+        files["sub/.gitignore"] = "# comment\nignored/\n*.log\n!test-kept.log\n"
+        self.tempdir = temp_tree(self, files)
+
+    def files(self, *args, **kwargs):
+        return [
+            os.path.relpath(item, self.tempdir)
+            for item in get_test_files(self.tempdir, *args, **kwargs)
+        ]
+
+    def testRecursive(self):
+        self.assertEqual(
+            self.files(["test-*", "test-?"], recursive=True, exclude=["other/"]),
+            ["sub/deep/test-c", "sub/test-b", "sub/test-kept.log", "test-a"],
+        )
+        self.assertEqual(
+            self.files(["sub/*/test-*"], recursive=True), ["sub/deep/test-c"]
+        )
+        self.assertEqual(self.files(["**/test-c"], recursive=True), ["sub/deep/test-c"])
+
+    def testOverlappingGlobs(self):
+        self.assertEqual(self.files(["test-*", "test-a"]), ["test-a"])
+        self.assertEqual(
+            self.files(["test-*", "sub/test-*"], exclude=["*.log"]),
+            ["test-a", "sub/test-b"],
+        )
+        self.assertEqual(
+            self.files(["sub/test-*"], exclude=["test-*", "!test-kept.log"]),
+            ["sub/test-kept.log"],
+        )
+
+    def testNodeNames(self):
+        out = yaml_fmf_output(
+            path=self.tempdir,
+            testfile_globs=["test-?"],
+            fmf_file="",
+            recursive=True,
+            exclude=["deep"],
+        )
+        self.assertEqual(list(out), ["/other/test-f", "/sub/test-b", "/test-a"])
+
+
+class TestStatic(unittest.TestCase):
+    def testSameAsImport(self):
+        for testfile_globs in (["test-basic"], ["check-example.py"]):
+            config = read_config(CURRENT_DIR / "metadata_config.yaml")
+            imported = yaml_fmf_output(
+                path=CURRENT_DIR,
+                testfile_globs=testfile_globs,
+                config=config,
+            )
+            static = yaml_fmf_output(
+                path=CURRENT_DIR,
+                testfile_globs=testfile_globs,
+                config=config,
+                static=True,
+            )
+            self.assertEqual(dict_to_yaml(imported), dict_to_yaml(static))
+
+    def testNotImported(self):
+        with patch.object(static_collector, "filepath_tests") as filepath_tests:
+            out = filepath_tests_static(str(CURRENT_DIR / "test-basic"))
+        filepath_tests.assert_not_called()
+        self.assertEqual(
+            {cls.name for cls in out}, {"Test1", "TestDictMerge", "TestLinks"}
+        )
+
+    def testFallback(self):
+        out = yaml_fmf_output(
+            path=CURRENT_DIR, testfile_globs=["test-static-fallback"], static=True
+        )
+        data = out["/test-static-fallback"]["/Test"]["/test"]
+        self.assertEqual(data["tag"], ["local"])
+        self.assertEqual(data["tier"], "tier2")
+
+    def testBadFMFKey(self):
+        with self.assertRaises(FMFError) as ctx:
+            yaml_fmf_output(
+                path=CURRENT_DIR, testfile_globs=["test-bad-fmf-key"], static=True
+            )
+        self.assertIn("fmf decorator nonsense not found in dict_", str(ctx.exception))
+
+    STATIC_HEADER = """
+\"\"\" Test file with tests discovered statically \"\"\"
+import unittest
+from fmf_metadata import FMF
+
+
+@FMF.tier("1")
+class TestA(unittest.TestCase):
+    def test_one(self):
+        pass
+"""
+    STATIC_FALLBACKS = {
+        "if": "if True:\n    class TestB(unittest.TestCase):\n"
+        "        def test(self):\n            pass\n",
+        "try": "try:\n    import nonexisting\nexcept ImportError:\n"
+        "    TestA.test_two = TestA.test_one\n",
+        "for": "for name in ['test_two']:\n    setattr(TestA, name, TestA.test_one)\n",
+        "with": "with open(__file__):\n    TestA.test_two = TestA.test_one\n",
+        "class body": "class TestB(unittest.TestCase):\n    def test_one(self):\n"
+        "        pass\n\n    test_alias = test_one\n",
+        "redecorated": 'TestA = FMF.tier("5")(TestA)\n',
+        "imported": "from static_helper_tests import TestBase\n",
+    }
+
+    def static_outputs(self, source):
+        tempdir = temp_tree(
+            self,
+            {
+                "static_helper_tests.py": "import unittest\n\n\n"
+                "class TestBase(unittest.TestCase):\n"
+                "    def test_base(self):\n        pass\n",
+                "test-static": self.STATIC_HEADER + "\n" + source,
+            },
+        )
+        self.addCleanup(sys.modules.pop, "static_helper_tests", None)
+        with patch.object(sys, "path", [tempdir] + sys.path), patch.object(
+            static_collector, "filepath_tests", wraps=static_collector.filepath_tests
+        ) as filepath_tests:
+            static = yaml_fmf_output(
+                path=tempdir, testfile_globs=["test-static"], static=True
+            )
+            imported = yaml_fmf_output(path=tempdir, testfile_globs=["test-static"])
+        return static, imported, filepath_tests.called
+
+    def testStaticFallbacks(self):
+        for name, source in self.STATIC_FALLBACKS.items():
+            with self.subTest(name):
+                static, imported, fallback = self.static_outputs(source)
+                self.assertTrue(fallback)
+                self.assertEqual(static, imported)
+
+    def testStaticModeled(self):
+        source = (
+            "class TestB(unittest.TestCase):\n"
+            '    """docstring"""\n\n    maxDiff = None\n\n    def test(self):\n'
+            '        pass\n\n\nif __name__ == "__main__":\n    unittest.main()\n'
+        )
+        static, imported, fallback = self.static_outputs(source)
+        self.assertFalse(fallback)
+        self.assertEqual(static, imported)
@@ -1,10 +1,16 @@
+import importlib.util
 import unittest
 import subprocess
 import shutil
+import sys
 import yaml
 import tempfile
 import os
 
+from fmf_metadata.base import FMFError, fmf_registry
+from fmf_metadata.pytest_collector import collect_sharded
+from tests.helpers import CURRENT_DIR, temp_tree
+
 PYTEST_PATH = os.path.join(os.path.realpath(os.path.dirname(__file__)), "pytest")
 
 
@@ -42,3 +48,104 @@ class PytestFMF(unittest.TestCase):
                 out["/test_pytest.py"]["/test_param[a]"]["summary"],
                 "test_pytest.py test_param[a]",
             )
+
+
+class TestShardedCollection(unittest.TestCase):
+    def setUp(self):
+        files = {
+            f"{name}/test_{name}.py": CURRENT_DIR / "pytest" / "unit" / "test_pytest.py"
+            for name in ["a", "b", "crash"]
+        }
+        files["crash/conftest.py"] = "import os\nos._exit(3)\n"
+        self.tempdir = temp_tree(self, files)
+
+    def testItems(self):
+        files = [os.path.join(self.tempdir, name, f"test_{name}.py") for name in "ab"]
+        items = collect_sharded(files, jobs=2)
+        self.assertEqual([item.fspath for item in items[:1]], files[:1])
+        self.assertEqual(
+            [item.name for item in items if item.fspath == files[1]],
+            [item.name for item in items if item.fspath == files[0]],
+        )
+        self.assertEqual(len(items), 18)
+        by_name = {item.name: item for item in items}
+        self.assertEqual(by_name["test"].cls.__name__, "A")
+        self.assertIsNone(by_name["test_pass"].cls)
+        self.assertEqual(
+            fmf_registry(by_name["test_pass"].function)["_fmf__tag"], ("", ["PASS"])
+        )
+        self.assertIn("skip", by_name["test_skip"].markers)
+        # parametrized items share one function
+        self.assertIs(
+            by_name["test_param[a]"].function, by_name["test_param[b]"].function
+        )
+        self.assertFalse(hasattr(by_name["test_pass"], "__dict__"))
+
+    def testMarkersOnce(self):
+        test_file = os.path.join(self.tempdir, "a", "test_marked.py")
+        with open(test_file, "w") as fd:
+            fd.write(
+                "import pytest\n\n\n@pytest.mark.slow\n"
+                "@pytest.mark.parametrize('x', [1, 2, pytest.param(3, marks=pytest.mark.fast)])\n"
+                "def test_x(x):\n    pass\n"
+            )
+        items = collect_sharded([test_file], jobs=1)
+        self.assertEqual(
+            fmf_registry(items[0].function)["_fmf__tag"], ("", ["slow", "fast"])
+        )
+
+    def testCrash(self):
+        files = [
+            os.path.join(self.tempdir, name, f"test_{name}.py")
+            for name in ["a", "crash"]
+        ]
+        with self.assertRaises(FMFError) as ctx:
+            collect_sharded(files, jobs=2)
+        self.assertIn("test_crash.py: exit code 3", str(ctx.exception))
+        self.assertNotIn("test_a.py", str(ctx.exception))
+
+
+class TestPytestPlugin(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = temp_tree(self, {".": CURRENT_DIR / "pytest"})
+        self.main_fmf = os.path.join(self.tempdir, "unit", "main.fmf")
+
+    def pytest(self, *args):
+        # installed package registers the plugin via entry point already
+        plugin_args = ["-p", "no:fmf_metadata", "-p", "fmf_metadata.pytest_plugin"]
+        return subprocess.run(
+            [sys.executable, "-m", "pytest"] + plugin_args + list(args),
+            cwd=self.tempdir,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            universal_newlines=True,
+        )
+
+    def testUpdate(self):
+        self.pytest("--collect-only", "--fmf-update", "unit")
+        with open(self.main_fmf) as fd:
+            out = yaml.safe_load(fd)
+        self.assertEqual(out["base"], "a")
+        self.assertEqual(
+            out["/test_pytest.py"]["/A"]["/test"]["test"],
+            "python3 -m pytest -m '' -v test_pytest.py::A::test",
+        )
+        self.assertEqual(out["/test_pytest.py"]["/test_skip"]["enabled"], False)
+
+    def testGenerate(self):
+        process = self.pytest("--fmf-generate", "unit/test_pytest.py::test_pass")
+        self.assertIn("-v test_pytest.py::test_pass", process.stdout)
+        self.assertIn("1 passed", process.stdout)
+        with open(self.main_fmf) as fd:
+            self.assertEqual(yaml.safe_load(fd), {"base": "a"})
+
+    @unittest.skipUnless(importlib.util.find_spec("xdist"), "pytest-xdist missing")
+    def testXdist(self):
+        self.pytest("--collect-only", "--fmf-update", "unit")
+        with open(self.main_fmf) as fd:
+            expected = yaml.safe_load(fd)
+        shutil.copy(CURRENT_DIR / "pytest" / "unit" / "main.fmf", self.main_fmf)
+        process = self.pytest("-n", "3", "--fmf-update", "unit")
+        self.assertIn("passed", process.stdout)
+        with open(self.main_fmf) as fd:
+            self.assertEqual(yaml.safe_load(fd), expected)
@@ -0,0 +1,101 @@
+import os
+import sys
+import unittest
+from unittest.mock import patch
+
+import yaml
+
+from fmf_metadata import cli
+from fmf_metadata.base import FMFError
+from fmf_metadata.watch import PollingWaiter, watch
+from tests.helpers import temp_tree
+
+
+class TestWatch(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = temp_tree(self, {"test.py": "pass\n"})
+        self.test_file = os.path.join(self.tempdir, "test.py")
+
+    def watch(self, change, update, iterations=1):
+        class Waiter(PollingWaiter):
+            def wait(self):
+                change()
+
+        watch(
+            lambda: [self.test_file],
+            update,
+            waiter=Waiter(),
+            debounce=0,
+            iterations=iterations,
+        )
+
+    def append(self, path):
+        with open(path, "a") as fd:
+            fd.write("pass\n")
+
+    def testChange(self):
+        changed = list()
+        self.watch(lambda: self.append(self.test_file), changed.append)
+        self.assertEqual(changed, [[self.test_file]])
+
+    def testNewFile(self):
+        changed = list()
+        new_file = os.path.join(self.tempdir, "test_new.py")
+        self.watch(lambda: self.append(new_file), changed.append)
+        # new files are visible as changed directory
+        self.assertEqual(changed, [[self.tempdir]])
+
+    def testFailedUpdate(self):
+        changed = list()
+
+        def update(paths):
+            changed.append(paths)
+            raise FMFError("failed")
+
+        self.watch(lambda: self.append(self.test_file), update, iterations=2)
+        self.assertEqual(changed, [[self.test_file], [self.test_file]])
+
+    def testHelperModule(self):
+        helper = os.path.join(self.tempdir, "watch_helper.py")
+        with open(helper, "w") as fd:
+            fd.write("TIER = '1'\n")
+        with open(self.test_file, "w") as fd:
+            fd.write(
+                "import unittest\nimport watch_helper\nfrom fmf_metadata import FMF\n"
+                "\n\nclass Test(unittest.TestCase):\n"
+                "    @FMF.tier(watch_helper.TIER)\n    def test(self):\n        pass\n"
+            )
+        main_fmf = os.path.join(self.tempdir, "main.fmf")
+        opts = cli.arg_parser().parse_args(
+            ["--path", self.tempdir, "--file", main_fmf, "test.py"]
+        )
+        opts.fmf_update = True
+        watched = list()
+
+        def tier():
+            with open(main_fmf) as fd:
+                return yaml.safe_load(fd)["/test.py"]["/Test"]["/test"]["tier"]
+
+        class Waiter(PollingWaiter):
+            def wait(self):
+                if hasattr(self, "tier"):
+                    raise AssertionError("change of helper module not detected")
+                self.tier = tier()
+                with open(helper, "w") as fd:
+                    fd.write("TIER = '2'\n")
+
+        def one_update(paths, update):
+            watched.extend(paths())
+            watch(paths, update, waiter=waiter, debounce=0, iterations=1)
+
+        waiter = Waiter()
+        # helper module is not imported to this process
+        self.addCleanup(sys.modules.pop, "watch_helper", None)
+        with patch.object(sys, "path", [self.tempdir] + sys.path), patch(
+            "fmf_metadata.watch.watch", one_update
+        ):
+            cli.watch_mode(opts)
+        self.assertIn(os.path.realpath(helper), watched)
+        self.assertEqual(waiter.tier, "1")
+        self.assertEqual(tier(), "2")
+        self.assertNotIn("watch_helper", sys.modules)